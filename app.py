@@ -1,93 +1,21 @@
-import requests
-from bs4 import BeautifulSoup
-import html2text
-import re
-import gradio as gr
-from theme import create_zen_theme
 import tempfile
 import os
-import zipfile
-from urllib.parse import urlparse, unquote
-
-def scrape_wikipedia_to_markdown_final(url: str) -> str:
-    """
-    Wikipediaページをスクレイピングし、整形・不要部分削除を行い、
-    タイトルを付けてMarkdownに変換します。
-
-    処理フロー：
-    1. ページのタイトルをH1見出しとして取得します。
-    2. 「登場人物」などの<dt>タグを見出しに変換します。
-    3. 生成されたMarkdown文字列から「## 脚注」以降を完全に削除します。
-    4. [編集]リンクを削除します。
-    5. 最終的にタイトルと本文を結合して返します。
-
-    Args:
-        url (str): スクレイピング対象のWikipediaページのURL。
-
-    Returns:
-        str: 整形・変換された最終的なMarkdownコンテンツ。失敗した場合は空の文字列。
-    """
-    try:
-        # 1. HTMLの取得と解析
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()  # HTTPエラーがあれば例外を発生させる
-        response.encoding = response.apparent_encoding  # 文字コードを自動検出
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # --- ページのタイトルを取得 ---
-        title_tag = soup.find('h1', id='firstHeading')
-        page_title = title_tag.get_text(strip=True) if title_tag else "Wikipedia ページ"
-
-        # 2. 主要コンテンツエリアの特定
-        content_div = soup.find('div', class_='mw-parser-output')
-        if not content_div:
-            return "エラー: コンテンツエリアが見つかりませんでした。"
-
-        # 3. HTMLの事前整形（登場人物などの見出し化）
-        for dt_tag in content_div.find_all('dt'):
-            h4_tag = soup.new_tag('h4')
-            h4_tag.extend(dt_tag.contents)
-            dt_tag.replace_with(h4_tag)
-
-        # 4. HTMLからMarkdownへの一次変換
-        h = html2text.HTML2Text()
-        h.body_width = 0  # テキストの折り返しを無効にする
-        full_markdown_text = h.handle(str(content_div))
-
-        # 5. 生成されたMarkdownから「## 脚注」以降を削除
-        footnote_marker = "\n## 脚注"
-        footnote_index = full_markdown_text.find(footnote_marker)
-        body_text = full_markdown_text[:footnote_index] if footnote_index != -1 else full_markdown_text
-
-        # 6. [編集]リンクを正規表現で一括削除
-        cleaned_body = re.sub(r'\[\[編集\]\(.+?\)]\n', '', body_text)
-
-        # 7. タイトルと整形後の本文を結合
-        final_markdown = f"# {page_title}\n\n{cleaned_body.strip()}"
-
-        return final_markdown
-
-    except requests.exceptions.RequestException as e:
-        return f"HTTPリクエストエラー: {e}"
-    except Exception as e:
-        return f"予期せぬエラーが発生しました: {e}"
-
-def get_filename_from_url(url):
-    """URLからファイル名を生成する関数"""
-    try:
-        # URLからページ名を抽出
-        parsed_url = urlparse(url)
-        page_name = parsed_url.path.split('/')[-1]
-        # URLデコード
-        page_name = unquote(page_name)
-        # ファイル名として使用できない文字を置換
-        safe_filename = re.sub(r'[<>:"/\\|?*]', '_', page_name)
-        return f"{safe_filename}.md"
-    except:
-        return "wikipedia_page.md"
+import time
+from batch import DEFAULT_MAX_WORKERS
+from mediawiki_api import DEFAULT_FETCH_BACKEND
+from jobs import get_job_manager
+from metrics import start_memory_tracing, start_metrics_server
+# 変換処理は core.py にあります（既存の呼び出し元のためにここからも参照できるようにしています）
+from core import (
+    CONVERTER_OPTIONS,
+    convert_batch_url,
+    fetch_page_html,
+    get_filename_from_url,
+    prefetch_revisions,
+    run_batch,
+    scrape_wikipedia_to_markdown_final,
+)
+# Gradio は起動に時間がかかるため、インターフェースを作成するときに読み込みます
 
 def create_download_file(content, filename):
     """ダウンロード用の一時ファイルを作成する関数"""
@@ -104,24 +32,6 @@ def create_download_file(content, filename):
         print(f"ファイル作成エラー: {e}")
         return None
 
-def create_zip_file(file_paths, zip_filename="wikipedia_export.zip"):
-    """複数のファイルをZIP形式でまとめる関数"""
-    try:
-        temp_dir = tempfile.gettempdir()
-        zip_path = os.path.join(temp_dir, zip_filename)
-        
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in file_paths:
-                if os.path.exists(file_path):
-                    # ファイル名のみを取得してZIPに追加
-                    filename = os.path.basename(file_path)
-                    zipf.write(file_path, filename)
-        
-        return zip_path
-    except Exception as e:
-        print(f"ZIP作成エラー: {e}")
-        return None
-
 def process_wikipedia_url(url):
     """Wikipedia URLを処理してMarkdownを生成するGradio用関数"""
     if not url:
@@ -146,8 +56,12 @@ def process_wikipedia_url(url):
     else:
         return markdown_content, None
 
-def process_multiple_urls(urls_text, progress=gr.Progress()):
-    """複数のWikipedia URLを一括処理してMarkdownを生成する関数"""
+def process_multiple_urls(urls_text, max_workers=DEFAULT_MAX_WORKERS, backend=None, progress=None):
+    """
+    複数のWikipedia URLを一括処理してMarkdownを生成する関数
+
+    progress には Gradio の進捗表示（gr.Progress）を渡せます（Noneなら表示しない）。
+    """
     if not urls_text.strip():
         return "URLリストを入力してください。", None, [], None
     
@@ -157,84 +71,82 @@ def process_multiple_urls(urls_text, progress=gr.Progress()):
     if not urls:
         return "有効なURLが見つかりませんでした。", None, [], None
     
-    results = []
-    all_content = []
-    individual_files = []
-    total_urls = len(urls)
-    success_count = 0
-    
-    for i, url in enumerate(urls):
-        progress((i + 1) / total_urls, f"処理中: {i + 1}/{total_urls}")
-        
-        # URLの検証
-        if not url.startswith('http'):
-            results.append(f"❌ 無効なURL: {url}")
-            continue
-            
-        if 'wikipedia.org' not in url:
-            results.append(f"❌ Wikipedia以外のURL: {url}")
-            continue
-        
-        # スクレイピング実行
-        try:
-            markdown_content = scrape_wikipedia_to_markdown_final(url)
-            if markdown_content.startswith("エラー:") or markdown_content.startswith("HTTP"):
-                results.append(f"❌ 処理失敗: {url}\n   エラー: {markdown_content}")
-            else:
-                # ページタイトルを抽出
-                title_match = re.match(r'^# (.+)', markdown_content)
-                page_title = title_match.group(1) if title_match else "不明なページ"
-                
-                # 文字数とファイル情報を表示
-                char_count = len(markdown_content)
-                filename = get_filename_from_url(url)
-                
-                results.append(f"✅ 処理成功: {url}")
-                results.append(f"   📄 ページタイトル: {page_title}")
-                results.append(f"   📊 文字数: {char_count:,} 文字")
-                results.append(f"   💾 ファイル名: {filename}")
-                
-                all_content.append(markdown_content)
-                success_count += 1
-                
-                # 個別ファイルを作成
-                file_path = create_download_file(markdown_content, filename)
-                if file_path:
-                    individual_files.append(file_path)
-        except Exception as e:
-            results.append(f"❌ 処理エラー: {url}")
-            results.append(f"   エラー内容: {str(e)}")
-    
-    # サマリー情報を追加
-    summary = [
-        "=" * 60,
-        "📊 処理結果サマリー",
-        "=" * 60,
-        f"🔗 処理対象URL数: {total_urls}",
-        f"✅ 成功: {success_count}",
-        f"❌ 失敗: {total_urls - success_count}",
-        ""
+    def report_progress(done, total):
+        if progress is not None:
+            progress(done / total, f"処理中: {done}/{total}")
+
+    result_text, combined_path, preview_paths, zip_path, _ = run_batch(
+        urls, max_workers, backend, on_done=report_progress
+    )
+    return result_text, combined_path, preview_paths, zip_path
+
+# ジョブの状態の表示名
+JOB_STATUS_LABELS = {
+    "queued": "⏳ 待機中",
+    "running": "🚀 実行中",
+    "done": "✅ 完了",
+    "failed": "❌ 失敗",
+    "cancelled": "⛔ キャンセル",
+}
+
+def submit_batch_job(urls_text, max_workers=DEFAULT_MAX_WORKERS, backend=None):
+    """一括処理をバックグラウンドのジョブとして登録し、(メッセージ, ジョブID) を返す関数"""
+    urls = [url.strip() for url in urls_text.strip().split('\n') if url.strip()]
+    if not urls:
+        return "URLリストを入力してください。", None
+
+    job_id = get_job_manager().submit(urls, max_workers, backend or DEFAULT_FETCH_BACKEND)
+    message = "\n".join([
+        "📨 ジョブを登録しました",
+        f"🆔 ジョブID: {job_id}",
+        f"🔗 処理対象URL数: {len(urls)}",
+        "「🗂️ ジョブ」タブで進捗の確認・キャンセル・結果のダウンロードができます（ブラウザを閉じても処理は続きます）。",
+    ])
+    return message, job_id
+
+def describe_job(job_id):
+    """ジョブの状態を (表示用テキスト, 結合ファイルのパス, ZIPファイルのパス) で返す関数"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return "ジョブが見つかりませんでした。ジョブIDを確認してください。", None, None
+
+    lines = [
+        f"🆔 ジョブID: {job['id']}",
+        f"📌 状態: {JOB_STATUS_LABELS.get(job['status'], job['status'])}",
+        f"📊 進捗: {job['done']}/{job['total']}",
     ]
-    
-    # 結果を結合
-    final_result = "\n".join(summary + results)
-    
-    # 一括ダウンロード用ファイルを作成
-    batch_file_path = None
-    if all_content:
-        combined_content = "\n\n" + "="*80 + "\n\n".join(all_content)
-        batch_file_path = create_download_file(combined_content, "wikipedia_batch_export.md")
-    
-    # ZIPファイルを作成
-    zip_file_path = None
-    if individual_files:
-        zip_file_path = create_zip_file(individual_files, "wikipedia_export.zip")
-    
-    return final_result, batch_file_path, individual_files, zip_file_path
+    if job["error"]:
+        lines.append(f"エラー内容: {job['error']}")
+    if job["result_text"]:
+        lines.extend(["", job["result_text"]])
+    return "\n".join(lines), job["combined_path"], job["zip_path"]
+
+def cancel_batch_job(job_id):
+    """ジョブをキャンセルし、結果のメッセージを返す関数"""
+    if get_job_manager().cancel(job_id):
+        return f"⛔ ジョブ {job_id.strip()} のキャンセルを受け付けました（処理中のページが終わり次第中断します）。"
+    return "キャンセルできませんでした（終了済み、または存在しないジョブです）。"
+
+def list_recent_jobs(limit=20):
+    """最近のジョブの一覧をMarkdownの表で返す関数"""
+    jobs = get_job_manager().recent(limit)
+    if not jobs:
+        return "ジョブはまだありません。"
+    rows = ["| ジョブID | 状態 | 進捗 | 登録日時 |", "|------|------|------|------|"]
+    for job in jobs:
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job["created_at"]))
+        rows.append(
+            f"| `{job['id']}` | {JOB_STATUS_LABELS.get(job['status'], job['status'])} "
+            f"| {job['done']}/{job['total']} | {created} |"
+        )
+    return "\n".join(rows)
 
 # Gradioインターフェースの作成
 def create_interface():
     """Gradioインターフェースを作成する関数"""
+    import gradio as gr
+    from theme import create_zen_theme
+
     theme = create_zen_theme()
     
     with gr.Blocks(theme=theme, title="Wikipedia to Markdown Converter") as demo:
@@ -312,7 +224,20 @@ def create_interface():
                             lines=10,
                             value="https://ja.wikipedia.org/wiki/Python\nhttps://ja.wikipedia.org/wiki/JavaScript"
                         )
+                        max_workers_input = gr.Slider(
+                            label="⚡ 並列数",
+                            minimum=1,
+                            maximum=16,
+                            step=1,
+                            value=DEFAULT_MAX_WORKERS
+                        )
+                        backend_input = gr.Radio(
+                            label="🌐 取得方式",
+                            choices=[("ページ全体を取得", "html"), ("MediaWiki APIで本文のみ取得", "api")],
+                            value=DEFAULT_FETCH_BACKEND
+                        )
                         batch_convert_btn = gr.Button("🚀 一括変換する", variant="primary")
+                        job_submit_btn = gr.Button("📨 バックグラウンドで実行する", variant="secondary")
                     
                     with gr.Column(scale=1):
                         batch_output_text = gr.Textbox(
@@ -341,8 +266,8 @@ def create_interface():
                             individual_file_5 = gr.File(label="", visible=False)
                 
                 # 一括処理ボタンクリック時の処理
-                def update_batch_output(urls_text):
-                    content, batch_file_path, individual_files, zip_file_path = process_multiple_urls(urls_text)
+                def update_batch_output(urls_text, max_workers, backend, progress=gr.Progress()):
+                    content, batch_file_path, individual_files, zip_file_path = process_multiple_urls(urls_text, int(max_workers), backend, progress)
                     
                     # 戻り値のリストを準備
                     outputs = [content]
@@ -377,7 +302,7 @@ def create_interface():
                 
                 batch_convert_btn.click(
                     fn=update_batch_output,
-                    inputs=urls_input,
+                    inputs=[urls_input, max_workers_input, backend_input],
                     outputs=[
                         batch_output_text, 
                         batch_download_file,
@@ -396,6 +321,70 @@ def create_interface():
                 gr.Markdown("2. 「🚀 一括変換する」ボタンをクリックします")
                 gr.Markdown("3. 処理の進行状況が表示され、完了後に結果が表示されます")
                 gr.Markdown("4. 各URLの処理結果（成功/失敗）が明確に表示されます")
+                gr.Markdown("5. 「⚡ 並列数」で同時に取得するページ数を調整できます（同じホストへのアクセスは自動的に間隔が調整されます）")
+                gr.Markdown("6. 「🌐 取得方式」でMediaWiki APIを選ぶと、記事本文だけを取得するため通信量が減り、版IDもまとめて問い合わせます")
+                gr.Markdown("7. 大量のURLは「📨 バックグラウンドで実行する」でジョブとして登録すると、ブラウザを閉じても処理が続き、「🗂️ ジョブ」タブで後から結果を受け取れます")
+            
+            # ジョブタブ
+            with gr.TabItem("🗂️ ジョブ"):
+                with gr.Row():
+                    with gr.Column(scale=1):
+                        job_id_input = gr.Textbox(
+                            label="🆔 ジョブID",
+                            placeholder="一括処理タブで登録したジョブのID"
+                        )
+                        with gr.Row():
+                            job_refresh_btn = gr.Button("🔄 状況を確認する", variant="primary")
+                            job_cancel_btn = gr.Button("⛔ キャンセルする", variant="stop")
+                        gr.Markdown("### 📋 最近のジョブ")
+                        job_list = gr.Markdown()
+                        job_list_refresh_btn = gr.Button("🔄 一覧を更新する")
+                    
+                    with gr.Column(scale=1):
+                        job_status_text = gr.Textbox(
+                            label="📝 ジョブの状況",
+                            lines=15,
+                            max_lines=30,
+                            show_copy_button=True
+                        )
+                        job_batch_file = gr.File(
+                            label="📥 全体をまとめてダウンロード",
+                            visible=False
+                        )
+                        job_zip_file = gr.File(
+                            label="🗜️ ZIPファイルでダウンロード",
+                            visible=False
+                        )
+                
+                def update_job_output(job_id):
+                    content, batch_file_path, zip_file_path = describe_job(job_id)
+                    return (
+                        content,
+                        gr.update(value=batch_file_path, visible=True) if batch_file_path else gr.update(visible=False),
+                        gr.update(value=zip_file_path, visible=True) if zip_file_path else gr.update(visible=False),
+                    )
+                
+                def submit_job(urls_text, max_workers, backend):
+                    message, job_id = submit_batch_job(urls_text, int(max_workers), backend)
+                    return message, job_id or "", list_recent_jobs()
+                
+                job_refresh_btn.click(
+                    fn=update_job_output,
+                    inputs=job_id_input,
+                    outputs=[job_status_text, job_batch_file, job_zip_file]
+                )
+                job_cancel_btn.click(
+                    fn=cancel_batch_job,
+                    inputs=job_id_input,
+                    outputs=job_status_text
+                )
+                job_list_refresh_btn.click(fn=list_recent_jobs, outputs=job_list)
+                job_submit_btn.click(
+                    fn=submit_job,
+                    inputs=[urls_input, max_workers_input, backend_input],
+                    outputs=[batch_output_text, job_id_input, job_list]
+                )
+                demo.load(fn=list_recent_jobs, outputs=job_list)
         
         gr.Markdown("---")
         gr.Markdown("### 🎯 基本的な使用方法")
@@ -419,6 +408,14 @@ def create_interface():
     return demo
 
 if __name__ == "__main__":
+    # WIKI2MD_METRICS_PORT が設定されていれば /metrics を公開
+    start_metrics_server()
+    # WIKI2MD_TRACE_MEMORY=1 であればページごとのピークメモリを計測
+    start_memory_tracing()
+
+    # ジョブのワーカーを起動（前回未完了のジョブは再実行される）
+    get_job_manager()
+
     # インターフェースを作成
     demo = create_interface()
     
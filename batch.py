@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+# 並列数とホストごとのレート制限の既定値（環境変数で上書き可能）
+DEFAULT_MAX_WORKERS = int(os.environ.get("WIKI2MD_MAX_WORKERS", "4"))
+DEFAULT_RATE_PER_HOST = float(os.environ.get("WIKI2MD_RATE_PER_HOST", "5"))
+DEFAULT_BURST_PER_HOST = int(os.environ.get("WIKI2MD_BURST_PER_HOST", "5"))
+
+
+class TokenBucket:
+    """
+    トークンバケット方式のレートリミッター
+
+    1秒あたり rate 個のトークンが補充され、最大 capacity 個まで貯まります。
+    acquire() はトークンが1つ取得できるまで呼び出し元スレッドをブロックします。
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """トークンを1つ消費する（足りなければ補充まで待機）"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._updated_at
+                self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            # ロックを離してから待機し、他ホストの処理を妨げない
+            time.sleep(wait_seconds)
+
+
+class HostRateLimiter:
+    """
+    ホスト（ja.wikipedia.org など）ごとにトークンバケットを持つレートリミッター
+
+    rate が0以下の場合は制限を行いません。
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE_PER_HOST, burst: int = DEFAULT_BURST_PER_HOST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str) -> None:
+        """URLのホストに対応するトークンを1つ取得する"""
+        if self.rate <= 0:
+            return
+        host = urlparse(url).netloc.lower()
+        if not host:
+            return
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[host] = bucket
+        bucket.acquire()
+
+
+class SingleFlight:
+    """
+    同じキーの処理が同時に呼ばれた場合に、1回だけ実行して結果を共有するクラス
+
+    最初の呼び出し元が処理を実行し、実行中に同じキーで呼ばれた呼び出し元は
+    その完了を待って同じ結果（または例外）を受け取ります。完了後の呼び出しは再び実行されます。
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """key の処理が実行中ならその結果を待ち、そうでなければ func(*args, **kwargs) を実行する"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executed += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+# アプリ全体で共有するレートリミッター（複数の一括処理が同時に走っても合計で制限する）
+default_rate_limiter = HostRateLimiter()
+
+
+def iter_batch(func, items, max_workers=None, on_done=None):
+    """
+    items の各要素に func を並列に適用し、結果を入力順に yield する関数
+
+    同時に実行中・待機中のタスクは max_workers の2倍までに抑えるため、
+    入力が大量でもメモリ使用量は一定に保たれます。
+
+    Args:
+        func: 各要素に適用する関数。
+        items: 処理対象のシーケンス。
+        max_workers (int): 並列数。省略時は DEFAULT_MAX_WORKERS。
+        on_done: 1件完了するごとに (完了件数, 総件数) で呼ばれるコールバック。
+
+    Yields:
+        tuple: (要素, funcの戻り値) を入力順で返します。
+    """
+    items = list(items)
+    total = len(items)
+    max_workers = max(1, int(max_workers or DEFAULT_MAX_WORKERS))
+    window = max_workers * 2
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        finished = {}
+        next_submit = 0
+        next_yield = 0
+        done_count = 0
+
+        while next_yield < total:
+            # 実行ウィンドウに空きがあれば次のタスクを投入
+            while next_submit < total and next_submit - next_yield < window:
+                future = executor.submit(func, items[next_submit])
+                pending[future] = next_submit
+                next_submit += 1
+
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                finished[pending.pop(future)] = future
+                done_count += 1
+                if on_done:
+                    on_done(done_count, total)
+
+            # 入力順で先頭から揃った分だけ返す
+            while next_yield in finished:
+                future = finished.pop(next_yield)
+                yield items[next_yield], future.result()
+                next_yield += 1
@@ -0,0 +1,78 @@
+"""
+Markdown変換のベンチマーク兼一致確認
+
+従来の変換（<dt>の置換 → str(content_div) → html2text で再解析 →
+「## 脚注」以降の切り取り → [編集]リンクの正規表現削除）と、
+markdown_converter.WikipediaMarkdownConverter による1回の走査での変換を比較します。
+全てのページで出力が完全に一致することを確認し、一致しない場合は終了コード1を返します。
+
+使い方:
+    python -m benchmarks.bench_convert                 # サンプルページで計測
+    python -m benchmarks.bench_convert page1.html ...  # 保存したHTMLで計測
+"""
+import argparse
+import re
+import sys
+import time
+
+import html2text
+
+from benchmarks.bench_parse import load_pages
+from markdown_converter import WikipediaMarkdownConverter
+from parsing import parse_wikipedia_html
+
+
+def convert_legacy(content_div):
+    """従来の変換処理（複数回の走査）"""
+    for dt_tag in content_div.find_all('dt'):
+        dt_tag.name = 'h4'
+        dt_tag.attrs = {}
+    h = html2text.HTML2Text()
+    h.body_width = 0
+    full_markdown_text = h.handle(str(content_div))
+    footnote_index = full_markdown_text.find("\n## 脚注")
+    body_text = full_markdown_text[:footnote_index] if footnote_index != -1 else full_markdown_text
+    return re.sub(r'\[\[編集\]\(.+?\)]\n', '', body_text).strip()
+
+
+def convert_single_pass(content_div):
+    """1回の走査での変換処理"""
+    return WikipediaMarkdownConverter().convert(content_div).strip()
+
+
+def measure(func, html, parser, repeat):
+    """変換にかかった1回あたりのCPU時間（解析は含まない）と出力を返す"""
+    total = 0.0
+    output = None
+    for _ in range(repeat):
+        _, content_div = parse_wikipedia_html(html, parser)
+        start = time.process_time()
+        output = func(content_div)
+        total += time.process_time() - start
+    return total / repeat, output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Markdown変換の速度と出力の一致を確認します")
+    parser.add_argument("paths", nargs="*", help="計測するHTMLファイル（省略時はサンプルページ）")
+    parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数")
+    parser.add_argument("--parser", default="html.parser", help="使用するHTMLパーサー")
+    args = parser.parse_args(argv)
+
+    mismatches = 0
+    print(f"{'page':<16}{'size':>10}{'legacy ms':>12}{'single ms':>12}{'speedup':>10}  identical")
+    for page_name, html in load_pages(args.paths).items():
+        legacy_cpu, legacy_output = measure(convert_legacy, html, args.parser, args.repeat)
+        single_cpu, single_output = measure(convert_single_pass, html, args.parser, args.repeat)
+        identical = legacy_output == single_output
+        mismatches += not identical
+        print(
+            f"{page_name:<16}{len(html.encode('utf-8')):>10,}"
+            f"{legacy_cpu * 1000:>12.1f}{single_cpu * 1000:>12.1f}"
+            f"{legacy_cpu / single_cpu if single_cpu else 0:>10.2f}  {'yes' if identical else 'NO'}"
+        )
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
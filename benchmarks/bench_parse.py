@@ -0,0 +1,81 @@
+"""
+HTML解析のベンチマーク
+
+従来の「ページ全体を html.parser で解析してから本文を探す」方法と、
+parsing.parse_wikipedia_html による本文だけの解析を、パーサーごとに
+1ページあたりのCPU時間とピークメモリで比較します。
+
+使い方:
+    python -m benchmarks.bench_parse                 # サンプルページで計測
+    python -m benchmarks.bench_parse page1.html ...  # 保存したHTMLで計測
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from benchmarks.sample_pages import generate_corpus
+from parsing import SUPPORTED_PARSERS, is_parser_available, parse_wikipedia_html
+
+
+def parse_full_page(html):
+    """従来の方法（ページ全体を html.parser で解析）"""
+    soup = BeautifulSoup(html, 'html.parser')
+    title_tag = soup.find('h1', id='firstHeading')
+    content_div = soup.find('div', class_='mw-parser-output')
+    return (title_tag.get_text(strip=True) if title_tag else None), content_div
+
+
+def measure(func, html, repeat):
+    """1回あたりのCPU時間（秒）とピークメモリ（バイト）を計測する"""
+    start = time.process_time()
+    for _ in range(repeat):
+        func(html)
+    cpu = (time.process_time() - start) / repeat
+
+    tracemalloc.start()
+    func(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def load_pages(paths):
+    if not paths:
+        return generate_corpus()
+    pages = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTML解析のCPU時間とピークメモリを比較します")
+    parser.add_argument("paths", nargs="*", help="計測するHTMLファイル（省略時はサンプルページ）")
+    parser.add_argument("--repeat", type=int, default=3, help="CPU時間を計測する繰り返し回数")
+    args = parser.parse_args(argv)
+
+    methods = [("full/html.parser", parse_full_page)]
+    for name in SUPPORTED_PARSERS:
+        if is_parser_available(name):
+            methods.append((f"scoped/{name}", lambda html, name=name: parse_wikipedia_html(html, name)))
+
+    print(f"{'page':<16}{'size':>10}  {'method':<22}{'cpu ms':>10}{'peak MiB':>10}{'cpu x':>8}{'mem x':>8}")
+    for page_name, html in load_pages(args.paths).items():
+        baseline = None
+        for method_name, func in methods:
+            cpu, peak = measure(func, html, args.repeat)
+            if baseline is None:
+                baseline = (cpu, peak)
+            print(
+                f"{page_name:<16}{len(html.encode('utf-8')):>10,}  {method_name:<22}"
+                f"{cpu * 1000:>10.1f}{peak / 1024 / 1024:>10.2f}"
+                f"{baseline[0] / cpu if cpu else 0:>8.1f}{baseline[1] / peak if peak else 0:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+ベンチマーク結果（benchmarks.run の出力）の比較
+
+2つの結果のJSONを比べ、レイテンシ・ピークRSSの増加やスループットの低下が
+しきい値を超えた項目を回帰として表示し、終了コード1を返します。
+
+使い方:
+    python -m benchmarks.compare base.json head.json
+    python -m benchmarks.compare base.json head.json --threshold 0.05
+"""
+import argparse
+import json
+import sys
+
+
+def collect_metrics(results):
+    """
+    比較する値を {項目名: (値, 大きいほど良いか)} で返す関数
+    """
+    metrics = {}
+    for name, page in results.get("pages", {}).items():
+        metrics[f"latency/{name}/median_ms"] = (page["latency_ms"]["median"], False)
+        metrics[f"peak_rss/{name}_mb"] = (page["peak_rss_mb"], False)
+    for concurrency, batch in results.get("throughput", {}).items():
+        metrics[f"throughput/workers={concurrency}/pages_per_second"] = (batch["pages_per_second"], True)
+        metrics[f"peak_rss/batch_workers={concurrency}_mb"] = (batch["peak_rss_mb"], False)
+    return metrics
+
+
+def compare(base, head, threshold):
+    """
+    2つの結果を比較する関数
+
+    Returns:
+        tuple: (表示用の行のリスト, 回帰した項目のリスト)
+    """
+    base_metrics = collect_metrics(base)
+    head_metrics = collect_metrics(head)
+    lines = [f"{'metric':<52}{'base':>12}{'head':>12}{'change':>10}"]
+    regressions = []
+    for name, (head_value, higher_is_better) in head_metrics.items():
+        if name not in base_metrics:
+            continue
+        base_value = base_metrics[name][0]
+        change = (head_value - base_value) / base_value if base_value else 0.0
+        regressed = (-change if higher_is_better else change) > threshold
+        if regressed:
+            regressions.append(name)
+        lines.append(
+            f"{name:<52}{base_value:>12.2f}{head_value:>12.2f}{change:>+10.1%}{'  ← 回帰' if regressed else ''}"
+        )
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="2つのベンチマーク結果を比較します")
+    parser.add_argument("base", help="基準の結果（JSON）")
+    parser.add_argument("head", help="比較する結果（JSON）")
+    parser.add_argument("--threshold", type=float, default=0.10, help="回帰とみなす変化の割合（既定値は10%%）")
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+
+    print(f"base: {base['meta'].get('commit')}  head: {head['meta'].get('commit')}")
+    lines, regressions = compare(base, head, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} 件の回帰があります（しきい値 {args.threshold:.0%}）")
+        return 1
+    print("\n回帰はありません")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+ベンチマーク用のページ集（コーパス）
+
+サンプルページ（sample_pages.py）から生成するか、実際のWikipediaページを
+記録したディレクトリから読み込みます。記録したディレクトリには各ページのHTMLと
+manifest.json（名前・タイトル・元のURL・版ID・ファイル名）を保存します。
+
+使い方:
+    # 小さなスタブから最大級の記事までを記録する（1行に1URL）
+    python -m benchmarks.corpus record urls.txt -o benchmarks/fixtures/
+    # 記録したページの一覧
+    python -m benchmarks.corpus list benchmarks/fixtures/
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from dataclasses import dataclass
+
+from benchmarks.sample_pages import PAGE_SIZES, generate_page
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+@dataclass
+class CorpusPage:
+    """コーパスの1ページ"""
+    name: str
+    title: str
+    html: str
+    revid: int
+
+    @property
+    def size(self):
+        return len(self.html.encode('utf-8'))
+
+
+def synthetic_corpus(seed=0):
+    """PAGE_SIZES の各サイズのサンプルページを小さい順に返す関数"""
+    return [
+        CorpusPage(name, f"Sample_{name}",
+                   generate_page(title=f"Sample_{name}", sections=sections, seed=seed, revision=100000 + index),
+                   100000 + index)
+        for index, (name, sections) in enumerate(PAGE_SIZES.items())
+    ]
+
+
+def load_corpus(directory=None):
+    """
+    コーパスを読み込む関数（directory を省略するとサンプルページを生成します）
+
+    Returns:
+        list: CorpusPage のリスト（HTMLの小さい順）。
+    """
+    if not directory:
+        return synthetic_corpus()
+    with open(os.path.join(directory, MANIFEST_FILENAME), encoding='utf-8') as f:
+        manifest = json.load(f)
+    pages = []
+    for entry in manifest["pages"]:
+        with open(os.path.join(directory, entry["file"]), encoding='utf-8') as f:
+            pages.append(CorpusPage(entry["name"], entry["title"], f.read(), entry["revid"]))
+    return sorted(pages, key=lambda page: page.size)
+
+
+def record(urls, directory):
+    """
+    Wikipediaのページを取得してコーパスとして保存する関数
+
+    ページ全体のHTMLをそのまま保存するため、記録後はネットワークなしで同じ計測ができます。
+    """
+    from cache import extract_revision_id
+    from core import get_filename_from_url
+    from http_client import fetch_text
+    from parsing import parse_wikipedia_html
+
+    os.makedirs(directory, exist_ok=True)
+    entries = []
+    for index, url in enumerate(urls):
+        html = fetch_text(url, validators=None)
+        title, _ = parse_wikipedia_html(html)
+        name = re.sub(r'\.md$', '', get_filename_from_url(url))
+        filename = f"{index:03d}_{hashlib.sha256(url.encode('utf-8')).hexdigest()[:8]}.html"
+        with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+            f.write(html)
+        revid = int(extract_revision_id(html) or 0) or index + 1
+        entries.append({"name": name, "title": title or name, "url": url, "revid": revid, "file": filename})
+        print(f"{name}: {len(html.encode('utf-8')):,} bytes", file=sys.stderr)
+
+    with open(os.path.join(directory, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump({"pages": entries}, f, ensure_ascii=False, indent=2)
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ベンチマーク用のページ集を記録・表示します")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="WikipediaのページをHTMLのまま保存する")
+    record_parser.add_argument("urls", help="URLリストのファイル（1行に1つ）")
+    record_parser.add_argument("-o", "--output-dir", required=True, help="保存先ディレクトリ")
+    list_parser = commands.add_parser("list", help="コーパスのページを表示する")
+    list_parser.add_argument("directory", nargs="?", help="記録したディレクトリ（省略時はサンプルページ）")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        with open(args.urls, encoding='utf-8') as f:
+            urls = [line.strip() for line in f if line.strip()]
+        record(urls, args.output_dir)
+    else:
+        for page in load_corpus(args.directory):
+            print(f"{page.name:<24}{page.size:>12,} bytes  rev {page.revid}  {page.title}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+取得から書き込みまでの処理全体のベンチマーク
+
+コーパスのページをローカルのサーバー（server.py）から取得して、次の項目を計測し、
+コミット間で比較できるJSONに書き出します（比較は compare.py）。
+
+- ページごとのレイテンシ（convert_url の1回あたりの時間と段階ごとの内訳）
+- 並列数ごとの一括処理のスループット（ZIP・結合ファイルへの書き込みを含む）
+- それぞれのピークRSS
+
+計測はそれぞれ別のプロセスで行うため、ピークRSSは計測ごとの値になります。
+キャッシュとレート制限は無効にして計測します。
+
+使い方:
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run --corpus benchmarks/fixtures/ --concurrency 1,4,8 -o results.json
+    python -m benchmarks.compare base.json results.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.corpus import load_corpus
+from benchmarks.server import page_url, start_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 計測するプロセスの環境変数（キャッシュ・レート制限・条件付きGETを無効にする）
+WORKER_ENV = {
+    "WIKI2MD_CACHE": "0",
+    "WIKI2MD_RATE_PER_HOST": "0",
+    "WIKI2MD_HTTP_VALIDATOR_ENTRIES": "0",
+}
+
+
+def peak_rss_mb():
+    """このプロセスのピークRSS（MB）"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux はKB、macOS はバイト単位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure_latency(spec):
+    """1ページを repeat 回変換し、1回あたりの時間と段階ごとの内訳（中央値）を返す"""
+    from core import convert_url
+
+    rss_before = peak_rss_mb()
+    convert_url(spec["url"], spec["backend"])  # 初回の読み込み等を除くための空実行
+    totals = []
+    stages = {}
+    for _ in range(spec["repeat"]):
+        start = time.perf_counter()
+        result = convert_url(spec["url"], spec["backend"])
+        totals.append(time.perf_counter() - start)
+        if not result.ok:
+            raise RuntimeError(result.error)
+        for stage, seconds in result.timings.items():
+            stages.setdefault(stage, []).append(seconds)
+    return {
+        "latency_ms": {
+            "median": statistics.median(totals) * 1000,
+            "min": min(totals) * 1000,
+            "max": max(totals) * 1000,
+        },
+        "stages_ms": {stage: statistics.median(values) * 1000 for stage, values in stages.items()},
+        "output_chars": len(result.markdown),
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure_throughput(spec):
+    """一括処理（取得・変換・ZIPと結合ファイルへの書き込み）を指定した並列数で実行する"""
+    import tempfile
+
+    from batch import iter_batch
+    from core import convert_url, get_filename_from_url
+    from export import StreamingExporter
+
+    rss_before = peak_rss_mb()
+    failed = 0
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory, StreamingExporter(directory) as exporter:
+        for url, result in iter_batch(
+            lambda url: convert_url(url, spec["backend"]), spec["urls"], max_workers=spec["concurrency"]
+        ):
+            if result.ok:
+                exporter.add(get_filename_from_url(url), result.markdown)
+            else:
+                failed += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "pages": len(spec["urls"]),
+        "failed": failed,
+        "seconds": elapsed,
+        "pages_per_second": len(spec["urls"]) / elapsed,
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+WORKERS = {"latency": measure_latency, "throughput": measure_throughput}
+
+
+def run_worker(kind, spec):
+    """計測を別のプロセスで実行し、結果を返す"""
+    env = dict(os.environ, **WORKER_ENV)
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--worker", kind],
+        input=json.dumps(spec), capture_output=True, text=True, env=env, cwd=REPO_ROOT,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{kind} の計測に失敗しました:\n{completed.stderr}")
+    return json.loads(completed.stdout)
+
+
+def git_revision():
+    """現在のコミット（取得できなければNone）と未コミットの変更の有無"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                capture_output=True, text=True, check=True)
+        return commit.stdout.strip(), bool(status.stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def run_benchmarks(args):
+    pages = load_corpus(args.corpus)
+    if args.pages:
+        names = set(args.pages.split(","))
+        pages = [page for page in pages if page.name in names]
+    server = start_server(pages)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    from parsing import DEFAULT_PARSER
+    commit, dirty = git_revision()
+    results = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parser": os.environ.get("WIKI2MD_PARSER", DEFAULT_PARSER),
+            "backend": args.backend,
+            "corpus": args.corpus or "synthetic",
+            "repeat": args.repeat,
+        },
+        "pages": {},
+        "throughput": {},
+    }
+
+    try:
+        for page in pages:
+            spec = {"url": page_url(base_url, page), "backend": args.backend, "repeat": args.repeat}
+            entry = {"bytes": page.size, **run_worker("latency", spec)}
+            results["pages"][page.name] = entry
+            print(
+                f"latency  {page.name:<16}{page.size:>12,} bytes{entry['latency_ms']['median']:>10.1f} ms"
+                f"{entry['peak_rss_mb']:>9.1f} MB",
+                file=sys.stderr,
+            )
+
+        # スループットは大きすぎるページを除いたページを繰り返して batch_size 件にする
+        batch_pages = [page for page in pages if page.size <= args.throughput_max_bytes] or pages[:1]
+        urls = [page_url(base_url, batch_pages[i % len(batch_pages)]) for i in range(args.batch_size)]
+        for concurrency in args.concurrency:
+            spec = {"urls": urls, "backend": args.backend, "concurrency": concurrency}
+            entry = run_worker("throughput", spec)
+            results["throughput"][str(concurrency)] = entry
+            print(
+                f"batch    workers={concurrency:<8}{entry['pages']:>8} pages{entry['pages_per_second']:>10.2f} pages/s"
+                f"{entry['peak_rss_mb']:>9.1f} MB",
+                file=sys.stderr,
+            )
+    finally:
+        server.shutdown()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="取得から書き込みまでの処理全体を計測します")
+    parser.add_argument("--worker", choices=sorted(WORKERS), help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", help="記録したページのディレクトリ（省略時はサンプルページ）")
+    parser.add_argument("--pages", help="計測するページ名（カンマ区切り、省略時は全て）")
+    parser.add_argument("--backend", choices=("html", "api"), default="html", help="取得方式")
+    parser.add_argument("--repeat", type=int, default=3, help="ページごとの計測回数")
+    parser.add_argument("--concurrency", type=lambda value: [int(v) for v in value.split(",")],
+                        default=[1, 2, 4, 8], help="スループットを計測する並列数（カンマ区切り）")
+    parser.add_argument("--batch-size", type=int, default=24, help="スループット計測の1回あたりのページ数")
+    parser.add_argument("--throughput-max-bytes", type=int, default=512 * 1024,
+                        help="スループット計測に使うページの最大サイズ（バイト）")
+    parser.add_argument("-o", "--output", help="結果のJSONの出力先（省略時は標準出力）")
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(WORKERS[args.worker](json.load(sys.stdin))))
+        return 0
+
+    results = run_benchmarks(args)
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
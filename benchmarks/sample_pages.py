@@ -0,0 +1,185 @@
+"""
+ベンチマーク用のWikipedia風サンプルページを生成するモジュール
+
+実際のWikipediaページと同じ構造（<head>内の巨大なスクリプト、サイドバー、
+mw-parser-output の本文、編集リンク、<dt>、脚注、ナビボックス等）を持つHTMLを、
+節の数を変えて小さなスタブから巨大な記事まで生成します。
+"""
+import random
+
+# 生成するページの大きさ（名前: 節の数）
+PAGE_SIZES = {
+    "stub": 2,
+    "small": 10,
+    "medium": 60,
+    "large": 300,
+    "huge": 1200,
+}
+
+WORDS = [
+    "プログラミング", "言語", "設計", "開発", "バージョン", "ライブラリ", "構文", "実装",
+    "標準", "仕様", "互換性", "コンパイラ", "インタプリタ", "モジュール", "型", "関数",
+]
+
+
+def _sentence(rng, links=True):
+    parts = []
+    for _ in range(rng.randint(6, 14)):
+        word = rng.choice(WORDS)
+        roll = rng.random()
+        if links and roll < 0.15:
+            parts.append(f'<a href="/wiki/{word}" title="{word}">{word}</a>')
+        elif roll < 0.2:
+            parts.append(f"<b>{word}</b>")
+        elif roll < 0.25:
+            parts.append(f"<i>{word}</i>")
+        else:
+            parts.append(word)
+    ref = rng.randint(1, 50)
+    parts.append(
+        f'<sup id="cite_ref-{ref}" class="reference"><a href="#cite_note-{ref}">&#91;{ref}&#93;</a></sup>'
+    )
+    return "".join(parts) + "。"
+
+
+def _edit_section(title, section):
+    return (
+        '<span class="mw-editsection"><span class="mw-editsection-bracket">[</span>'
+        f'<a href="/w/index.php?title=Sample&amp;action=edit&amp;section={section}" title="節を編集: {title}">'
+        '<span>編集</span></a><span class="mw-editsection-bracket">]</span></span>'
+    )
+
+
+def _heading(level, title, section, legacy):
+    if legacy:
+        # 旧形式: 見出しの中に mw-headline と編集リンクがある
+        return (
+            f'<h{level}><span class="mw-headline" id="{title}">{title}</span>'
+            f'{_edit_section(title, section)}</h{level}>\n'
+        )
+    return (
+        f'<div class="mw-heading mw-heading{level}"><h{level} id="{title}">{title}</h{level}>'
+        f'{_edit_section(title, section)}</div>\n'
+    )
+
+
+def _section_body(rng, index):
+    blocks = []
+    for _ in range(rng.randint(2, 5)):
+        blocks.append(f"<p>{''.join(_sentence(rng) for _ in range(rng.randint(1, 4)))}\n</p>")
+    kind = index % 5
+    if kind == 0:
+        items = "".join(f"<li>{_sentence(rng)}</li>\n" for _ in range(rng.randint(3, 8)))
+        blocks.append(f"<ul>{items}</ul>")
+    elif kind == 1:
+        entries = "".join(
+            f"<dt>{rng.choice(WORDS)}{i}（声 - {rng.choice(WORDS)}）</dt>\n<dd>{_sentence(rng)}</dd>\n"
+            for i in range(rng.randint(2, 6))
+        )
+        blocks.append(f"<dl>{entries}</dl>")
+    elif kind == 2:
+        rows = "".join(
+            f"<tr><td>{rng.choice(WORDS)}</td><td>{rng.randint(1, 9999)}</td><td>{_sentence(rng, False)}</td></tr>\n"
+            for _ in range(rng.randint(3, 10))
+        )
+        blocks.append(
+            f'<table class="wikitable"><tbody><tr><th>名前</th><th>値</th><th>説明</th></tr>\n{rows}</tbody></table>'
+        )
+    elif kind == 3:
+        blocks.append(
+            '<div class="mw-highlight mw-highlight-lang-python"><pre>'
+            '<span class="k">def</span> <span class="nf">main</span>():\n'
+            '    <span class="k">if</span> a &lt; b &amp;&amp; c &gt; d:\n'
+            '        <span class="nb">print</span>(<span class="s2">"Hello"</span>)\n'
+            '</pre></div>'
+        )
+    else:
+        blocks.append(
+            '<figure class="mw-default-size" typeof="mw:File/Thumb"><a href="/wiki/File:Sample.png" class="mw-file-description">'
+            '<img src="//upload.wikimedia.org/sample.png" width="220" height="124" class="mw-file-element"></a>'
+            f"<figcaption>{_sentence(rng, False)}</figcaption></figure>"
+        )
+    return "\n".join(blocks) + "\n"
+
+
+def generate_page(title="Sample", sections=10, seed=0, revision=100000):
+    """
+    Wikipedia風のHTMLページを生成する関数
+
+    Args:
+        title (str): ページタイトル。
+        sections (int): 本文の節の数。
+        seed (int): 乱数のシード（同じ値なら同じHTMLになる）。
+        revision (int): ページ設定に埋め込む版ID。
+
+    Returns:
+        str: HTML文字列。
+    """
+    rng = random.Random(seed)
+    script = "".join(f'"wgVar{i}":"{rng.choice(WORDS)}",' for i in range(400))
+    sidebar = "".join(
+        f'<li id="n-{i}"><a href="/wiki/Special:{i}"><span>{rng.choice(WORDS)}</span></a></li>' for i in range(150)
+    )
+    languages = "".join(
+        f'<li class="interlanguage-link"><a href="https://l{i}.wikipedia.org/wiki/{title}" lang="l{i}">L{i}</a></li>'
+        for i in range(120)
+    )
+
+    body = [
+        '<div class="hatnote">この項目では、サンプルについて説明しています。</div>\n',
+        '<table class="infobox"><tbody>'
+        + "".join(f"<tr><th>{w}</th><td>{_sentence(rng, False)}</td></tr>" for w in WORDS[:8])
+        + "</tbody></table>\n",
+        '<style data-mw-deduplicate="TemplateStyles:r1">.mw-parser-output .hatnote{font-style:italic}</style>\n',
+        f"<p><b>{title}</b>は、{_sentence(rng)}&nbsp;{_sentence(rng)}\n</p>\n",
+    ]
+    for index in range(sections):
+        legacy = index % 2 == 1
+        body.append(_heading(2, f"節{index}", index * 2 + 1, legacy))
+        body.append(_section_body(rng, index))
+        if index % 3 == 0:
+            body.append(_heading(3, f"小節{index}", index * 2 + 2, legacy))
+            body.append(_section_body(rng, index + 1))
+
+    references = "".join(
+        f'<li id="cite_note-{i}"><span class="mw-cite-backlink"><a href="#cite_ref-{i}">^</a></span> '
+        f'<span class="reference-text">{_sentence(rng, False)}</span></li>\n'
+        for i in range(1, 51)
+    )
+    body.append(_heading(2, "脚注", sections * 2 + 1, False))
+    body.append(f'<div class="reflist"><ol class="references">{references}</ol></div>\n')
+    body.append(_heading(2, "外部リンク", sections * 2 + 2, False))
+    body.append('<ul><li><a rel="nofollow" class="external text" href="https://example.org/">公式サイト</a></li></ul>\n')
+    body.append(
+        '<div class="navbox"><table class="nowraplinks"><tbody>'
+        + "".join(f'<tr><td><a href="/wiki/{w}">{w}</a></td></tr>' for w in WORDS * 5)
+        + "</tbody></table></div>\n"
+    )
+    body.append("<!-- NewPP limit report\nCPU time usage: 1.000 seconds\n-->\n")
+
+    return (
+        '<!DOCTYPE html>\n<html class="client-nojs" lang="ja" dir="ltr"><head>\n<meta charset="UTF-8">\n'
+        f"<title>{title} - Wikipedia</title>\n"
+        f'<script>RLCONF={{"wgPageName":"{title}","wgRevisionId":{revision},{script}"wgEnd":true}};</script>\n'
+        '<link rel="stylesheet" href="/w/load.php?modules=site.styles">\n</head>\n'
+        '<body class="skin-vector mediawiki"><div class="vector-header-container"><header class="vector-header">'
+        f'<nav id="mw-panel"><ul>{sidebar}</ul></nav></header></div>\n'
+        '<div class="mw-page-container"><main id="content" class="mw-body">\n'
+        f'<h1 id="firstHeading" class="firstHeading mw-first-heading"><span class="mw-page-title-main">{title}</span></h1>\n'
+        '<div id="bodyContent" class="vector-body"><div id="siteSub">出典: フリー百科事典『ウィキペディア（Wikipedia）』</div>\n'
+        '<div id="mw-content-text" class="mw-body-content">'
+        f'<div class="mw-content-ltr mw-parser-output" lang="ja" dir="ltr">\n{"".join(body)}</div>'
+        '</div><div id="catlinks" class="catlinks"><a href="/wiki/Category:Sample">カテゴリ</a></div></div>\n'
+        f'</main><nav class="vector-page-toolbar"><ul>{languages}</ul></nav></div>\n'
+        '<footer id="footer" class="mw-footer"><ul><li>最終更新 2025年1月1日</li></ul></footer>\n'
+        "<script>(RLQ=window.RLQ||[]).push(function(){mw.config.set({\"wgBackendResponseTime\":120});});</script>\n"
+        "</body></html>\n"
+    )
+
+
+def generate_corpus(seed=0):
+    """PAGE_SIZES の各サイズのページを {名前: HTML} で返す関数"""
+    return {
+        name: generate_page(title=f"Sample_{name}", sections=sections, seed=seed)
+        for name, sections in PAGE_SIZES.items()
+    }
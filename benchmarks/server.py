@@ -0,0 +1,142 @@
+"""
+ベンチマーク用のWikipediaの代わりのローカルHTTPサーバー
+
+コーパスのページを /wiki/タイトル で、MediaWiki API の action=query（版ID）と
+action=parse（本文）を /w/api.php で返します。ネットワークやWikipedia側の
+混み具合に左右されずに、取得を含めた処理全体を計測できます。
+APIはタイトルの正規化（アンダースコア・先頭の小文字）とリダイレクトも本物と同じ形で返すため、
+tests/ のテストでも使用します。
+
+使い方:
+    python -m benchmarks.server --port 8080                       # サンプルページ
+    python -m benchmarks.server --corpus benchmarks/fixtures/     # 記録したページ
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+from benchmarks.corpus import load_corpus
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    pages = {}
+    pages_by_revid = {}
+    redirects = {}
+    # 受け付けたAPIリクエストのパラメーター（テストでの呼び出し回数の確認用）
+    api_requests = []
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        if parsed.path == "/w/api.php":
+            self.api_requests.append(query)
+        if parsed.path.startswith("/wiki/"):
+            page = self.pages.get(unquote(parsed.path[len("/wiki/"):]).replace("_", " "))
+            if page is not None:
+                return self._send(page.html, "text/html")
+        elif parsed.path == "/w/api.php":
+            if query.get("action") == "query":
+                return self._send(json.dumps(self._query(query.get("titles", ""))), "application/json")
+            if query.get("action") == "parse":
+                title = self._resolve(self._normalize(query["page"])) if query.get("page") else None
+                page = self.pages_by_revid.get(query.get("oldid")) or self.pages.get(title)
+                if page is None:
+                    error = {"code": "missingtitle", "info": "The page you specified doesn't exist."}
+                    return self._send(json.dumps({"error": error}), "application/json")
+                data = {"parse": {"title": page.title, "revid": page.revid, "text": page.html}}
+                return self._send(json.dumps(data), "application/json")
+        self._send("", "text/plain", status=404)
+
+    @staticmethod
+    def _normalize(title):
+        """MediaWikiと同じく、アンダースコアを空白にして先頭の文字を大文字にする"""
+        title = title.replace("_", " ").strip()
+        return title[:1].upper() + title[1:]
+
+    def _resolve(self, title):
+        return self.redirects.get(title, title)
+
+    def _query(self, titles):
+        normalized, redirects, pages = [], [], {}
+        for title in titles.split("|"):
+            name = self._normalize(title)
+            if name != title:
+                normalized.append({"from": title, "to": name})
+            target = self._resolve(name)
+            if target != name:
+                redirects.append({"from": name, "to": target})
+            page = self.pages.get(target)
+            if page is None:
+                pages[target] = {"title": target, "missing": True}
+            else:
+                pages[target] = {"title": target, "revisions": [{"revid": page.revid}]}
+        query = {"pages": list(pages.values())}
+        if normalized:
+            query["normalized"] = normalized
+        if redirects:
+            query["redirects"] = redirects
+        return {"query": query}
+
+    def _send(self, body, content_type, status=200):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(pages, host="127.0.0.1", port=0, redirects=None):
+    """
+    コーパスのページを返すサーバーをバックグラウンドで起動する関数
+
+    Args:
+        pages (list): CorpusPage のリスト。
+        redirects (dict): リダイレクト元のタイトル → リダイレクト先のタイトル。
+
+    Returns:
+        ThreadingHTTPServer: 起動したサーバー（server_address でポートが分かります）。
+    """
+    handler = type("StandInHandler", (_StandInHandler,), {
+        "pages": {page.title.replace("_", " "): page for page in pages},
+        "pages_by_revid": {str(page.revid): page for page in pages},
+        "redirects": dict(redirects or {}),
+        "api_requests": [],
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def page_url(base_url, page):
+    """コーパスのページのURLを返す関数"""
+    return f"{base_url}/wiki/{quote(page.title.replace(' ', '_'))}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ベンチマーク用のWikipediaの代わりのサーバーを起動します")
+    parser.add_argument("--corpus", help="記録したページのディレクトリ（省略時はサンプルページ）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args(argv)
+
+    pages = load_corpus(args.corpus)
+    server = start_server(pages, args.host, args.port)
+    base_url = f"http://{args.host}:{server.server_address[1]}"
+    for page in pages:
+        print(page_url(base_url, page))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+
+# キャッシュの既定値（環境変数で上書き可能）
+CACHE_ENABLED = os.environ.get("WIKI2MD_CACHE", "1") != "0"
+CACHE_DIR = os.environ.get(
+    "WIKI2MD_CACHE_DIR", os.path.join(tempfile.gettempdir(), "wikipedia_to_markdown_cache")
+)
+CACHE_TTL = float(os.environ.get("WIKI2MD_CACHE_TTL", str(24 * 60 * 60)))
+MEMORY_CACHE_BYTES = int(os.environ.get("WIKI2MD_MEMORY_CACHE_BYTES", str(64 * 1024 * 1024)))
+DISK_CACHE_BYTES = int(os.environ.get("WIKI2MD_DISK_CACHE_BYTES", str(1024 * 1024 * 1024)))
+
+# Markdown用のキャッシュキーでHTMLを1回にハッシュする文字数
+HASH_CHUNK_SIZE = 64 * 1024
+
+# ページ設定に埋め込まれている版ID（"wgRevisionId":12345）
+REVISION_ID_PATTERN = re.compile(r'"wgRevisionId":\s*(\d+)')
+
+
+def extract_revision_id(html):
+    """HTMLから版IDを取り出す関数（見つからなければNone）"""
+    match = REVISION_ID_PATTERN.search(html)
+    return match.group(1) if match else None
+
+
+def html_cache_key(url, revision=None, backend="html"):
+    """生HTML用のキャッシュキー（取得方式 + URL + 版ID）を生成する関数"""
+    return f"{backend}:{url}#rev={revision or 'latest'}"
+
+
+def markdown_cache_key(html, options):
+    """Markdown用のキャッシュキー（HTMLのハッシュ + 変換オプション）を生成する関数"""
+    # 大きなページ全体をエンコードしたコピーを作らないよう、少しずつハッシュする（値は一度にハッシュした場合と同じ）
+    html_hash = hashlib.sha256()
+    for index in range(0, len(html), HASH_CHUNK_SIZE):
+        html_hash.update(html[index:index + HASH_CHUNK_SIZE].encode('utf-8'))
+    html_hash = html_hash.hexdigest()
+    options_hash = hashlib.sha256(json.dumps(options, sort_keys=True).encode('utf-8')).hexdigest()
+    return f"{html_hash}:{options_hash[:16]}"
+
+
+class MemoryCache:
+    """
+    プロセス内のLRUキャッシュ
+
+    保持している値の合計サイズが max_bytes を超えると、
+    最も長く使われていないエントリから削除します。
+    """
+
+    def __init__(self, max_bytes=MEMORY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl=None, expires_at=None):
+        """値を保存する（ttl秒後、または時刻 expires_at に期限切れ。どちらもなければ無期限）"""
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        if ttl:
+            expires_at = time.time() + ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at)
+            self._size += size
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._size -= len(value)
+
+
+class DiskCache:
+    """
+    SQLiteを使ったディスクキャッシュ
+
+    値はzlibで圧縮して保存します。合計サイズが max_bytes を超えると
+    最終アクセスが古いエントリから削除します。
+    """
+
+    def __init__(self, path, max_bytes=DISK_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " expires_at REAL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON entries (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key):
+        """(値, 期限の時刻) を返す（なければNone、期限がなければ時刻はNone）"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return zlib.decompress(value).decode('utf-8'), expires_at
+
+    def put(self, key, value, ttl=None):
+        data = zlib.compress(value.encode('utf-8'), 1)
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), expires_at, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """期限切れのエントリと、容量超過分の古いエントリを削除する"""
+        self._conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+
+class TwoTierCache:
+    """
+    メモリ（LRU）とディスク（SQLite）の2段キャッシュ
+
+    キーは名前空間（"html" / "markdown"）ごとに分けて管理し、
+    ヒット・ミスの回数を名前空間ごとに数えます。
+    """
+
+    def __init__(self, directory=CACHE_DIR, memory_bytes=MEMORY_CACHE_BYTES, disk_bytes=DISK_CACHE_BYTES):
+        self.memory = MemoryCache(memory_bytes)
+        self.disk = DiskCache(os.path.join(directory, "cache.sqlite3"), disk_bytes) if disk_bytes > 0 else None
+        self._stats = defaultdict(lambda: {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+        self._stats_lock = threading.Lock()
+
+    def get(self, namespace, key):
+        """キャッシュから値を取得する（なければNone）"""
+        full_key = f"{namespace}:{key}"
+        value = self.memory.get(full_key)
+        if value is not None:
+            self._count(namespace, "memory_hits")
+            return value
+        if self.disk is not None:
+            entry = self.disk.get_entry(full_key)
+            if entry is not None:
+                # ディスクでヒットした値は、ディスクと同じ期限でメモリにも載せておく
+                value, expires_at = entry
+                self.memory.put(full_key, value, expires_at=expires_at)
+                self._count(namespace, "disk_hits")
+                return value
+        self._count(namespace, "misses")
+        return None
+
+    def put(self, namespace, key, value, ttl=None):
+        """キャッシュに値を保存する（ttl秒で期限切れ、Noneなら無期限）"""
+        full_key = f"{namespace}:{key}"
+        self.memory.put(full_key, value, ttl)
+        if self.disk is not None:
+            self.disk.put(full_key, value, ttl)
+
+    def stats(self):
+        """名前空間ごとのヒット・ミス回数を返す"""
+        with self._stats_lock:
+            return {namespace: dict(counts) for namespace, counts in self._stats.items()}
+
+    def _count(self, namespace, field):
+        with self._stats_lock:
+            self._stats[namespace][field] += 1
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """アプリ全体で共有するキャッシュを返す関数（無効化されている場合はNone）"""
+    global _default_cache
+    if not CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = TwoTierCache()
+    return _default_cache
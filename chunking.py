@@ -0,0 +1,292 @@
+"""
+RAG向けの見出し単位のチャンク分割
+
+変換したMarkdownを見出しの階層（## / ### / <dt>から作った ####）ごとに分割し、
+見出しのパス・文字数・トークン数を付けたレコードにします。大きな節は段落・文の区切りで
+最大サイズ以下に分け、前のチャンクの末尾を重ねて（オーバーラップ）次のチャンクを始めます。
+
+レコードは1ページずつ作ってそのままJSONL（またはParquet）に書き出すため、
+一括処理でも全ページの文書をメモリに溜めることはありません。
+
+    for record in chunk_markdown(markdown, url=url, max_tokens=512, overlap_tokens=64):
+        writer.write(record)
+
+トークン数は tiktoken がインストールされていればその値、なければ文字種から見積もった値です。
+"""
+import json
+import math
+import os
+import re
+import sys
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken は任意の依存関係
+    tiktoken = None
+
+# チャンクの既定値（環境変数で上書き可能）
+CHUNK_MAX_TOKENS = int(os.environ.get("WIKI2MD_CHUNK_MAX_TOKENS", "512"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("WIKI2MD_CHUNK_OVERLAP_TOKENS", "64"))
+TOKEN_ENCODING = os.environ.get("WIKI2MD_TOKEN_ENCODING", "cl100k_base")
+
+# Markdownの見出し行（html2text はコードブロックをインデントで出力するため行頭の # は見出し）
+HEADING_PATTERN = re.compile(r'^(#{1,6}) +(.+?) *#*$')
+
+# 段落の区切りと文の区切り（句点・ピリオドなどの直後）
+PARAGRAPH_SPLIT_PATTERN = re.compile(r'\n{2,}')
+SENTENCE_SPLIT_PATTERN = re.compile(r'(?<=[。．！？!?])|(?<=[.;:])(?=\s)')
+
+# トークン数の見積もり: CJKの文字は1文字ずつ、それ以外は4文字で1トークンとする
+CJK_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯＀-￯]')
+
+# Parquetに書き出すときの1つの行グループのレコード数
+PARQUET_ROW_GROUP_SIZE = 1000
+
+
+class TokenCounter:
+    """tiktoken があればそのエンコーディングで、なければ見積もりでトークン数を数えるクラス"""
+
+    def __init__(self, encoding=TOKEN_ENCODING):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except (KeyError, ValueError, OSError):
+                # エンコーディングの定義を取得できない場合（オフラインなど）は見積もりにする
+                self._encoding = None
+        self.name = f"tiktoken:{encoding}" if self._encoding is not None else "estimate"
+
+    def __call__(self, text):
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        cjk = len(CJK_PATTERN.findall(text))
+        return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+_default_counter = None
+
+
+def default_token_counter():
+    """共有のトークンカウンターを返す関数（初回呼び出し時にエンコーディングを読み込む）"""
+    global _default_counter
+    if _default_counter is None:
+        _default_counter = TokenCounter()
+    return _default_counter
+
+
+def iter_sections(markdown_content):
+    """
+    Markdownを見出しごとの節に分ける関数
+
+    Yields:
+        tuple: (見出しのパスのリスト, 見出しのレベル, 本文)。先頭のH1見出しはパスの先頭になり、
+               最初の見出しより前の本文（導入部）はH1だけのパスで返します。
+    """
+    path = []  # (レベル, 見出し) のリスト
+    lines = []
+
+    def flush():
+        body = "\n".join(lines).strip()
+        lines.clear()
+        if body:
+            return [heading for _, heading in path], path[-1][0] if path else 0, body
+        return None
+
+    for line in markdown_content.split("\n"):
+        match = HEADING_PATTERN.match(line)
+        if match is None:
+            lines.append(line)
+            continue
+        section = flush()
+        if section:
+            yield section
+        level = len(match.group(1))
+        while path and path[-1][0] >= level:
+            path.pop()
+        path.append((level, match.group(2)))
+    section = flush()
+    if section:
+        yield section
+
+
+def _split_units(text, max_tokens, count_tokens):
+    """
+    本文を段落、段落が大きすぎれば文、それでも大きすぎれば文字数で max_tokens 以下に分ける
+
+    Yields:
+        tuple: (前の単位との区切り, 本文)。段落の先頭は空行、段落の途中は元の文字列のまま続ける。
+    """
+    for paragraph in PARAGRAPH_SPLIT_PATTERN.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= max_tokens:
+            yield "\n\n", paragraph
+            continue
+        separator = "\n\n"
+        for sentence in SENTENCE_SPLIT_PATTERN.split(paragraph):
+            if not sentence:
+                continue
+            tokens = count_tokens(sentence)
+            if tokens <= max_tokens:
+                yield separator, sentence
+                separator = ""
+                continue
+            # 区切りのない長い文は、トークン数に比例した文字数で切る
+            step = max(1, len(sentence) * max_tokens // tokens)
+            for start in range(0, len(sentence), step):
+                yield separator, sentence[start:start + step]
+                separator = ""
+
+
+def _join_units(units):
+    return "".join(separator + text for separator, text, _ in units).strip()
+
+
+def _pack_units(units, max_tokens, overlap_tokens, count_tokens):
+    """分けた本文を max_tokens 以下にまとめ、末尾の overlap_tokens 分を次のチャンクの先頭に重ねる"""
+    chunk = []  # (区切り, 本文, トークン数) のリスト
+    chunk_tokens = 0
+    has_new_unit = False
+    for separator, unit in units:
+        tokens = count_tokens(unit)
+        if chunk and chunk_tokens + tokens > max_tokens:
+            yield _join_units(chunk)
+            # 末尾から overlap_tokens 以内の単位を次のチャンクに持ち越す
+            carried = []
+            carried_tokens = 0
+            for entry in reversed(chunk):
+                unit_tokens = entry[2]
+                if carried_tokens + unit_tokens > overlap_tokens or carried_tokens + unit_tokens + tokens > max_tokens:
+                    break
+                carried.insert(0, entry)
+                carried_tokens += unit_tokens
+            chunk, chunk_tokens = carried, carried_tokens
+            has_new_unit = False
+        chunk.append((separator, unit, tokens))
+        chunk_tokens += tokens
+        has_new_unit = True
+    if chunk and has_new_unit:
+        yield _join_units(chunk)
+
+
+def chunk_markdown(markdown_content, url=None, title=None, max_tokens=CHUNK_MAX_TOKENS,
+                   overlap_tokens=CHUNK_OVERLAP_TOKENS, count_tokens=None):
+    """
+    1ページのMarkdownを見出し単位のチャンクのレコードに分ける関数
+
+    Args:
+        markdown_content (str): 変換したMarkdown（先頭はタイトルのH1見出し）。
+        url (str): ページのURL（レコードに含めます）。
+        title (str): ページタイトル（省略時は先頭のH1見出し）。
+        max_tokens (int): 1チャンクの最大トークン数。
+        overlap_tokens (int): 同じ節で続くチャンクに重ねる最大トークン数。
+        count_tokens: トークン数を数える関数（省略時は default_token_counter()）。
+
+    Yields:
+        dict: url / title / chunk_index / section_path / heading_level / text / char_count / token_count
+    """
+    count_tokens = count_tokens or default_token_counter()
+    if title is None:
+        # 先頭のH1見出し（導入部がないページでも、各節のパスの先頭になる）
+        match = HEADING_PATTERN.match(markdown_content.lstrip("\n").split("\n", 1)[0])
+        if match and len(match.group(1)) == 1:
+            title = match.group(2)
+    chunk_index = 0
+    for section_path, level, body in iter_sections(markdown_content):
+        units = _split_units(body, max_tokens, count_tokens)
+        for text in _pack_units(units, max_tokens, overlap_tokens, count_tokens):
+            yield {
+                "url": url,
+                "title": title,
+                "chunk_index": chunk_index,
+                "section_path": section_path,
+                "heading_level": level,
+                "text": text,
+                "char_count": len(text),
+                "token_count": count_tokens(text),
+            }
+            chunk_index += 1
+
+
+class JsonlChunkWriter:
+    """チャンクのレコードを1行ずつJSONで書き出すクラス（- で標準出力）"""
+
+    # flush() の後にメモリに残っているレコードの件数（JSONLは残らない）
+    pending_rows = 0
+
+    def __init__(self, path, append=False):
+        self._file = sys.stdout if path == "-" else open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if self._file is sys.stdout:
+            self._file.flush()
+        else:
+            self._file.close()
+
+
+class ParquetChunkWriter:
+    """
+    チャンクのレコードをParquetに書き出すクラス（pyarrow が必要）
+
+    flush()（1ページの区切り）の時点で PARQUET_ROW_GROUP_SIZE 件以上溜まっていれば行グループとして書き出すため、
+    メモリに溜めるのはその件数と1ページ分までです。ページの途中で行グループを区切ることはないため、
+    pending_rows が0になった時点で、それまでのページのチャンクは全てファイルに書き込まれています。
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquetで出力するには pyarrow をインストールしてください（pip install pyarrow）")
+        self._pa = pa
+        self._schema = pa.schema([
+            ("url", pa.string()),
+            ("title", pa.string()),
+            ("chunk_index", pa.int32()),
+            ("section_path", pa.list_(pa.string())),
+            ("heading_level", pa.int8()),
+            ("text", pa.string()),
+            ("char_count", pa.int32()),
+            ("token_count", pa.int32()),
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._rows = []
+
+    @property
+    def pending_rows(self):
+        """まだ行グループとして書き出していないレコードの件数"""
+        return len(self._rows)
+
+    def write(self, record):
+        self._rows.append(record)
+
+    def flush(self):
+        # 小さな行グループを増やさないよう、PARQUET_ROW_GROUP_SIZE 件になるまで溜めておく
+        if len(self._rows) >= PARQUET_ROW_GROUP_SIZE:
+            self._write_row_group()
+
+    def _write_row_group(self):
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+
+    def close(self):
+        self._write_row_group()
+        self._writer.close()
+
+
+def open_chunk_writer(path, append=False):
+    """出力先の拡張子に応じてチャンクの書き出し先を返す関数（.parquet ならParquet、それ以外はJSONL）"""
+    if path != "-" and path.endswith(".parquet"):
+        if append:
+            raise RuntimeError("Parquetの出力には追記できません（--restart で最初から処理してください）")
+        return ParquetChunkWriter(path)
+    return JsonlChunkWriter(path, append=append)
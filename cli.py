@@ -0,0 +1,258 @@
+"""
+Wikipedia to Markdown のコマンドライン版
+
+Gradioを読み込まずに、URLリストを一括でMarkdownに変換します。
+
+使い方:
+    python cli.py urls.txt -o output/              # 1ページ1ファイルでディレクトリに出力
+    python cli.py urls.txt --jsonl pages.jsonl     # 1ページ1行のJSONLで出力
+    cat urls.txt | python cli.py --jsonl -         # 標準入力から読み込み、標準出力へ
+    python cli.py urls.txt --chunks chunks.jsonl   # 見出し単位のチャンク（RAG向け、.parquet も可）
+
+処理が終わったURLはチェックポイントファイルに記録されるため、
+途中で止まった場合も同じコマンドを再実行すれば続きから処理します（失敗したURLは再度処理します）。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from batch import DEFAULT_MAX_WORKERS, iter_batch
+from chunking import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, chunk_markdown, open_chunk_writer
+from core import batch_page_key, convert_batch_url, extract_title, get_filename_from_url, prefetch_revisions
+from mediawiki_api import DEFAULT_FETCH_BACKEND, FETCH_BACKENDS
+from metrics import (
+    default_registry,
+    format_memory_summary,
+    format_summary,
+    record_stage,
+    start_memory_tracing,
+    start_metrics_server,
+)
+
+# ディレクトリ出力の場合のチェックポイントファイル名
+CHECKPOINT_FILENAME = ".wiki2md_checkpoint.jsonl"
+
+
+def read_urls(source):
+    """URLリストを読み込む関数（空行と # で始まる行は無視します）"""
+    stream = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        return [line.strip() for line in stream if line.strip() and not line.lstrip().startswith("#")]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def default_checkpoint_path(args):
+    """出力先に応じたチェックポイントファイルのパスを返す関数（標準出力の場合はNone）"""
+    if args.output_dir:
+        return os.path.join(args.output_dir, CHECKPOINT_FILENAME)
+    path = args.jsonl or args.chunks
+    if path != "-":
+        return path + ".checkpoint"
+    return None
+
+
+def load_checkpoint(path):
+    """チェックポイントから変換に成功したURLの集合を読み込む関数"""
+    completed = set()
+    if not path or not os.path.exists(path):
+        return completed
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 書き込み途中で止まった最終行は無視する
+                continue
+            if entry.get("status") == "ok":
+                completed.add(entry["url"])
+    return completed
+
+
+def write_checkpoint(checkpoint, entries):
+    """チェックポイントに処理済みのURLを書き込み、entries を空にする関数"""
+    for entry in entries:
+        checkpoint.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    checkpoint.flush()
+    entries.clear()
+
+
+class DirectoryWriter:
+    """1ページを1つのMarkdownファイルとしてディレクトリに書き出すクラス"""
+
+    # 書き出し先にまだ書き込んでいないレコードの件数（ChunkWriter 以外は常に0）
+    pending_rows = 0
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, url, markdown_content):
+        filename = get_filename_from_url(url)
+        with open(os.path.join(self.directory, filename), "w", encoding="utf-8") as f:
+            f.write(markdown_content)
+
+    def close(self):
+        pass
+
+
+class JsonlWriter:
+    """1ページを1行のJSONとして書き出すクラス"""
+
+    pending_rows = 0
+
+    def __init__(self, path, append=False):
+        if path == "-":
+            self._file = sys.stdout
+        else:
+            self._file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, url, markdown_content):
+        record = {
+            "url": url,
+            "title": extract_title(markdown_content),
+            "filename": get_filename_from_url(url),
+            "markdown": markdown_content,
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class ChunkWriter:
+    """1ページを見出し単位のチャンクに分けて、チャンクごとに1レコードとして書き出すクラス"""
+
+    def __init__(self, path, max_tokens, overlap_tokens, append=False):
+        self._writer = open_chunk_writer(path, append=append)
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @property
+    def pending_rows(self):
+        """書き出し先にまだ書き込んでいない（Parquetの行グループにしていない）チャンクの件数"""
+        return self._writer.pending_rows
+
+    def write(self, url, markdown_content):
+        for record in chunk_markdown(markdown_content, url=url, title=extract_title(markdown_content),
+                                     max_tokens=self.max_tokens, overlap_tokens=self.overlap_tokens):
+            self._writer.write(record)
+        self._writer.flush()
+
+    def close(self):
+        self._writer.close()
+
+
+def run(args):
+    start_metrics_server(args.metrics_port)
+    start_memory_tracing()
+    urls = list(dict.fromkeys(read_urls(args.input)))
+    checkpoint_path = args.checkpoint or default_checkpoint_path(args)
+    completed = set() if args.restart else load_checkpoint(checkpoint_path)
+    log = (lambda *lines: None) if args.quiet else (lambda *lines: print(*lines, sep="\n", file=sys.stderr))
+
+    # APIで取得する場合は版IDをまとめて問い合わせておく
+    backend = args.backend
+    revisions = prefetch_revisions(urls) if backend == "api" else {}
+
+    # 同じページを指すURL（表記揺れ・モバイル版・リダイレクトなど）は最初の1件だけを処理する。
+    # 処理済みのURLを除く前にまとめるため、再開時も省略したURLを取得し直すことはない
+    unique_urls = {}
+    for url in urls:
+        unique_urls.setdefault(batch_page_key(url, revisions), url)
+    if len(unique_urls) < len(urls):
+        log(f"同じページを指すURL {len(urls) - len(unique_urls)} 件を省略します")
+    completed_keys = {batch_page_key(url, revisions) for url in completed}
+    pending = [url for key, url in unique_urls.items() if key not in completed_keys]
+    if completed:
+        log(f"チェックポイントから再開します: 処理済み {len(unique_urls) - len(pending)} 件 / 残り {len(pending)} 件")
+
+    if args.output_dir:
+        writer = DirectoryWriter(args.output_dir)
+    elif args.chunks:
+        try:
+            writer = ChunkWriter(args.chunks, args.chunk_max_tokens, args.chunk_overlap_tokens, append=bool(completed))
+        except RuntimeError as e:
+            print(f"エラー: {e}", file=sys.stderr)
+            return 2
+    else:
+        writer = JsonlWriter(args.jsonl, append=bool(completed))
+    checkpoint = None
+    if checkpoint_path:
+        checkpoint = open(checkpoint_path, "w" if args.restart else "a", encoding="utf-8")
+
+    def convert(url):
+        return convert_batch_url(url, backend, revisions.get(url))
+
+    success_count = 0
+    unrecorded = []  # チェックポイントにまだ記録していないURL
+    start = time.perf_counter()
+    try:
+        for url, (lines, markdown_content) in iter_batch(convert, pending, max_workers=args.workers):
+            if markdown_content is None:
+                # 失敗は -q を指定しても表示する
+                print(*lines, sep="\n", file=sys.stderr)
+            else:
+                with record_stage("write") as stage:
+                    writer.write(url, markdown_content)
+                    stage.bytes = len(markdown_content.encode("utf-8"))
+                success_count += 1
+                log(*lines)
+            # 出力を書き終えてから記録する（途中で止まっても未出力のURLは処理済みにならない）。
+            # Parquetはメモリに溜めたチャンクが行グループとして書き込まれるまで記録を待つ
+            status = "ok" if markdown_content is not None else "error"
+            unrecorded.append({"url": url, "status": status})
+            if checkpoint and not writer.pending_rows:
+                write_checkpoint(checkpoint, unrecorded)
+    finally:
+        writer.close()
+        if checkpoint:
+            # close() で残りのチャンクも書き込んだため、記録を待っていたURLも処理済みにする
+            write_checkpoint(checkpoint, unrecorded)
+            checkpoint.close()
+
+    elapsed = time.perf_counter() - start
+    failure_count = len(pending) - success_count
+    print(
+        f"完了: 成功 {success_count} 件 / 失敗 {failure_count} 件"
+        f"（{elapsed:.1f} 秒、{success_count / elapsed if elapsed else 0:.1f} ページ/秒）",
+        file=sys.stderr,
+    )
+    # 段階ごとの処理時間（p50 / p95 / p99）
+    log(*format_summary(default_registry.summary()))
+    # ページごとのピークメモリ（WIKI2MD_TRACE_MEMORY=1 の場合）
+    log(*format_memory_summary(default_registry.peak_memory_summary()))
+    return 1 if failure_count else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="WikipediaのURLリストを一括でMarkdownに変換します")
+    parser.add_argument("input", nargs="?", default="-", help="URLリストのファイル（1行に1つ、省略時は標準入力）")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("-o", "--output-dir", help="Markdownファイルの出力先ディレクトリ")
+    output.add_argument("--jsonl", help="JSONLの出力先ファイル（- で標準出力）")
+    output.add_argument("--chunks", help="見出し単位のチャンクの出力先（.parquet ならParquet、それ以外はJSONL、- で標準出力）")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_MAX_WORKERS, help="並列数")
+    parser.add_argument("--backend", choices=FETCH_BACKENDS, default=DEFAULT_FETCH_BACKEND, help="取得方式")
+    parser.add_argument("--chunk-max-tokens", type=int, default=CHUNK_MAX_TOKENS, help="1チャンクの最大トークン数")
+    parser.add_argument("--chunk-overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS,
+                        help="続くチャンクに重ねる最大トークン数")
+    parser.add_argument("--checkpoint", help="チェックポイントファイル（省略時は出力先の隣に作成）")
+    parser.add_argument("--restart", action="store_true", help="チェックポイントを無視して最初から処理する")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="処理中に /metrics を公開するポート（省略時は WIKI2MD_METRICS_PORT）")
+    parser.add_argument("-q", "--quiet", action="store_true", help="成功したページの結果を表示しない")
+    return parser
+
+
+def main(argv=None):
+    return run(build_parser().parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,631 @@
+"""
+Wikipedia to Markdown の変換処理（Gradioに依存しないライブラリ部分）
+
+Webアプリ（app.py）・コマンドライン（cli.py）のどちらからも使用します。
+
+    from core import scrape_wikipedia_to_markdown_final
+    markdown = scrape_wikipedia_to_markdown_final("https://ja.wikipedia.org/wiki/Python")
+"""
+import os
+import re
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, unquote, parse_qs, parse_qsl, quote, urlencode, urljoin, urlunparse
+
+import requests
+
+from batch import DEFAULT_MAX_WORKERS, SingleFlight, iter_batch
+from cache import CACHE_TTL, extract_revision_id, get_cache, html_cache_key, markdown_cache_key
+from export import StreamingExporter
+from http_client import TruncatedText, fetch_text, truncate_text, utf8_length
+from mediawiki_api import (
+    DEFAULT_FETCH_BACKEND,
+    MediaWikiAPIError,
+    fetch_article_html,
+    parse_wiki_url,
+    query_revisions,
+)
+from markdown_converter import RAW_TEXT_TAGS, WikipediaMarkdownConverter
+from metrics import default_registry, measure_peak_memory, record_stage, trace_span
+from parsing import CONTENT_DIV_PATTERN, DEFAULT_PARSER, parse_wikipedia_html, parse_wikipedia_sections
+from rules import get_rules, rules_for_url
+
+# モバイル版のホスト（ja.m.wikipedia.org など）
+MOBILE_HOST_PATTERN = re.compile(r'^([^.]+)\.m\.(wikipedia\.org)$')
+
+# タイトルをURLに含めるときにエスケープしない文字（MediaWikiのURLと同じ）
+TITLE_SAFE_CHARS = ";@$!*(),/~:"
+
+# Markdown変換の設定（変更するとMarkdownのキャッシュキーも変わる）
+# 脚注などの節・[編集]リンクの扱いは言語版ごとのルールセット（rules.py）で決まる
+CONVERTER_OPTIONS = {
+    "parser": DEFAULT_PARSER,
+    "body_width": 0,
+}
+
+# 大きなページの扱い（環境変数で上書き可能）
+# 本文の最大バイト数（本文の<div>の開始タグから数える。超えた分は取得せず、本文の先頭から上限までを変換する。0で無制限）
+MAX_PAGE_BYTES = int(os.environ.get("WIKI2MD_MAX_PAGE_BYTES", "0"))
+# 本文より前（スキンのヘッダーなど）として、MAX_PAGE_BYTES とは別に受信するバイト数の上限
+MAX_HEAD_BYTES = 512 * 1024
+# 省メモリモード（本文を節ごとに解析して変換し終えた節から解放する・脚注以降を解析しない）
+LOW_MEMORY = os.environ.get("WIKI2MD_LOW_MEMORY", "0") == "1"
+
+# 上限で切り詰めたページのMarkdownの末尾に付ける注記
+TRUNCATION_NOTICE = "\n\n> ⚠️ ページが大きすぎるため、本文の先頭の {max_bytes:,} バイトまでを変換しました。"
+
+def fetch_page_html(url, backend=None, revision=None):
+    """
+    ページのHTMLを取得する関数（キャッシュにあればそれを返す）
+
+    backend が "api" の場合は MediaWiki API で本文だけを取得します。
+    版IDが分からなければ最新の版IDを問い合わせ、その版IDをキャッシュキーにします。
+
+    backend が "html" の場合は指定されたURL（最新の版）を取得するため、revision は既にキャッシュにあるかの
+    確認にだけ使い、取得したHTMLはHTMLに埋め込まれた版ID（wgRevisionId）をキーにして保存します。
+    問い合わせの後にページが編集されていても、別の版のHTMLが revision のキーに保存されることはありません。
+
+    本文が MAX_PAGE_BYTES を超えるページは切り詰めたHTML（TruncatedText）を返します
+    （受信の途中で切り詰めたHTMLはキャッシュに保存しません）。
+    """
+    backend = backend or DEFAULT_FETCH_BACKEND
+    cache = get_cache()
+
+    if backend == "api":
+        endpoint, title, oldid = parse_wiki_url(url)
+        revision = revision or oldid
+        if revision is None:
+            revision = query_revisions(endpoint, [title])[title]["revid"]
+            if revision is None:
+                raise MediaWikiAPIError(f"missingtitle: ページが見つかりませんでした: {title}")
+        # 版IDはWiki内で一意なので、リダイレクト経由の別URLでも同じキーになる
+        html_key = html_cache_key(endpoint, revision, backend)
+        html = cache.get('html', html_key) if cache else None
+        if html is None:
+            html, _ = fetch_article_html(endpoint, revid=revision)
+            if cache:
+                cache.put('html', html_key, html)
+        return truncate_page(html)
+
+    oldid = parse_qs(urlparse(url).query).get('oldid', [None])[0]
+    revision = revision or oldid
+    # 表記が違っても同じページを指すURLは同じキーにする（取得するのは指定されたURLのまま）
+    canonical_url = canonicalize_url(url)
+    html = cache.get('html', html_cache_key(canonical_url, revision, backend)) if cache else None
+    if html is not None:
+        return truncate_page(html)
+    # モバイル版のURLもPC版のHTMLを取得する（キャッシュキーはPC版のURLと共通のため）
+    html = fetch_text(desktop_url(url), max_bytes=MAX_PAGE_BYTES + MAX_HEAD_BYTES if MAX_PAGE_BYTES else None)
+    if cache and not isinstance(html, TruncatedText):
+        if revision:
+            # 版IDを指定したページは内容が変わらないため期限を設けない。?oldid= なしで取得した場合は
+            # 問い合わせた版より新しい版のこともあるため、実際に取得した版のIDで保存する
+            fetched_revision = oldid or extract_revision_id(html)
+            if fetched_revision:
+                cache.put('html', html_cache_key(canonical_url, fetched_revision, backend), html, ttl=None)
+        else:
+            cache.put('html', html_cache_key(canonical_url, None, backend), html, ttl=CACHE_TTL)
+    return truncate_page(html)
+
+def truncate_page(html):
+    """
+    本文が MAX_PAGE_BYTES を超えるHTMLを切り詰める関数（MAX_PAGE_BYTES が0ならそのまま返す）
+
+    本文の<div>の開始タグから数えて MAX_PAGE_BYTES までを残します。それより前のスキンのヘッダーなどは数えません
+    （開始タグが見つからない場合はHTMLの先頭から数えます）。
+    """
+    if not MAX_PAGE_BYTES:
+        return html
+    content_match = CONTENT_DIV_PATTERN.search(html)
+    return truncate_text(html, MAX_PAGE_BYTES, start=content_match.start() if content_match else 0)
+
+def prune_content_tree(content_div):
+    """変換に使わない要素（<script> / <style>）を変換前にツリーから取り除く関数"""
+    for tag in content_div.find_all(RAW_TEXT_TAGS):
+        tag.decompose()
+
+def convert_body_to_markdown(content_div, rules=None, following=(), release=False):
+    """
+    解析済みの本文をMarkdownに変換する関数（前後の空白は除去しません）
+
+    <dt>の見出し化・[編集]リンクの削除・「## 脚注」以降の除外を変換中に行います。
+    rules（rules.RuleSet）を省略すると既定のルールセットを使います。
+    following と release は WikipediaMarkdownConverter.convert() にそのまま渡します。
+    """
+    converter = WikipediaMarkdownConverter(
+        rules=rules or get_rules(),
+        body_width=CONVERTER_OPTIONS["body_width"],  # テキストの折り返しを無効にする
+    )
+    return converter.convert(content_div, following, release)
+
+def finish_markdown(page_title, body):
+    """タイトルのH1見出しと整形後の本文を結合する関数"""
+    return f"# {page_title}\n\n{body.strip()}"
+
+def convert_content_to_markdown(page_title, content_div, rules=None):
+    """解析済みの本文をMarkdownに変換し、タイトルのH1見出しを付けて返す関数"""
+    return finish_markdown(page_title, convert_body_to_markdown(content_div, rules))
+
+@dataclass
+class ConversionResult:
+    """
+    1ページ分の変換結果
+
+    timings / byte_counts には段階（fetch / cache / parse / transform / convert / postprocess）ごとの
+    処理時間（秒）と出力のバイト数が入ります。実行した段階だけが入ります
+    （cache はキャッシュが有効な場合、transform は省メモリモードの場合のみ）。
+    links には with_links=True で変換した場合に、本文からリンクしている記事のURLが入ります。
+    truncated は MAX_PAGE_BYTES で切り詰めて変換した場合にTrue、peak_memory は
+    tracemalloc で計測している場合の解析・変換中のピークメモリ（バイト）です。
+    """
+    url: str
+    markdown: Optional[str] = None
+    title: Optional[str] = None
+    error: Optional[str] = None
+    error_stage: Optional[str] = None
+    cache_hit: bool = False
+    timings: Dict[str, float] = field(default_factory=dict)
+    byte_counts: Dict[str, int] = field(default_factory=dict)
+    links: Optional[List[str]] = None
+    truncated: bool = False
+    peak_memory: Optional[int] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def total_seconds(self):
+        return sum(self.timings.values())
+
+# 同じページの取得・変換を同時に行わないための共有オブジェクト
+_page_flight = SingleFlight()
+
+def convert_url(url: str, backend=None, revision=None, with_links=False) -> ConversionResult:
+    """
+    Wikipediaページを取得してMarkdownに変換し、段階ごとの計測結果と共に返す関数
+
+    取得するのは指定されたURLのままです。canonicalize_url() でそろえたURLは同じページかどうかの
+    判定とキャッシュキーにだけ使い、同じページ（同じ取得方式・版ID）の変換が他のスレッドで
+    実行中であれば、取得・変換をやり直さずにその結果を共有します。
+
+    処理フロー：
+    1. fetch: ページのHTMLを取得します（キャッシュにあればそれを使います）。
+    2. cache: 同じHTMLを同じ設定で変換済みであれば、その結果を返します（キャッシュが有効な場合のみ）。
+    3. parse: ページのタイトルと本文の<div>だけを解析します。省メモリモードでは本文を h2 の節ごとに区切り、
+       ここでは最初の節だけを解析します（2つ目以降の節は 5. で1節ずつ解析し、変換し終えた節から解放します）。
+    4. transform: 省メモリモードでは、変換に使わない要素を最初の節のツリーから取り除きます（省メモリモードのみ）。
+    5. convert: 本文のツリーを1回たどってMarkdownに変換します。その際に
+       「登場人物」などの<dt>タグを見出しにし、[編集]リンクを削除し、
+       「## 脚注」以降は変換しません。
+    6. postprocess: タイトルと本文を結合し、キャッシュに保存します。
+
+    エラーは例外ではなく result.error（従来と同じ文字列）と result.error_stage で返します。
+
+    Args:
+        url (str): 対象のWikipediaページのURL。
+        backend (str): 取得方式（"html" / "api"）。省略時は DEFAULT_FETCH_BACKEND。
+        revision: 取得する版ID（分かっている場合）。
+        with_links (bool): 本文からリンクしている記事のURLを result.links に入れるかどうか
+            （Markdownがキャッシュにあっても本文の解析を行います）。
+
+    Returns:
+        ConversionResult: 変換結果。
+    """
+    canonical_url = canonicalize_url(url)
+    backend = backend or DEFAULT_FETCH_BACKEND
+    result = _page_flight.do(
+        (canonical_url, backend, revision, with_links),
+        _convert_page, url, backend, revision, with_links,
+    )
+    return replace(result, url=url)
+
+def _convert_page(url, backend, revision, with_links=False):
+    """convert_url() の本体"""
+    result = ConversionResult(url=url)
+    with trace_span("wiki2md.page", url=url):
+        try:
+            # 1. HTMLの取得（キャッシュになければ取得する）
+            with record_stage("fetch", result) as stage:
+                html = fetch_page_html(url, backend, revision)
+                stage.bytes = utf8_length(html)
+            result.truncated = isinstance(html, TruncatedText)
+
+            # 2. 同じHTMLを同じ設定で変換済みであればその結果を返す
+            rules = rules_for_url(url)
+            cache = get_cache()
+            markdown_key = cached_markdown = None
+            if cache:
+                with record_stage("cache", result):
+                    markdown_key = markdown_cache_key(html, {**CONVERTER_OPTIONS, "rules": rules.fingerprint})
+                    cached_markdown = cache.get('markdown', markdown_key)
+            if cached_markdown is not None and not with_links:
+                result.markdown = cached_markdown
+                result.title = extract_title(cached_markdown)
+                result.cache_hit = True
+                return result
+
+            # 3〜5. の解析と変換の間に増えたメモリのピークを計測する（WIKI2MD_TRACE_MEMORY=1 の場合）
+            with measure_peak_memory(result):
+                # 3. HTMLの解析（タイトルと本文の<div>だけをツリーにする）
+                following = ()
+                with record_stage("parse", result):
+                    if LOW_MEMORY and not with_links:
+                        # 省メモリモードでは本文を節ごとに解析し、「## 脚注」以降（出典・ナビゲーションなど）は解析しない
+                        title, content_div, following = parse_wikipedia_sections(
+                            html, CONVERTER_OPTIONS["parser"], stop_pattern=rules.stop_heading_pattern
+                        )
+                    else:
+                        title, content_div = parse_wikipedia_html(
+                            html, CONVERTER_OPTIONS["parser"],
+                            stop_pattern=rules.stop_heading_pattern if LOW_MEMORY else None,
+                        )
+                    if with_links and content_div:
+                        result.links = extract_article_links(content_div, url)
+                del html
+
+                if cached_markdown is not None:
+                    result.markdown = cached_markdown
+                    result.title = extract_title(cached_markdown)
+                    result.cache_hit = True
+                    return result
+
+                # 主要コンテンツエリアの特定
+                page_title = title or "Wikipedia ページ"
+                if not content_div:
+                    if result.truncated:
+                        result.error = (f"エラー: 上限（WIKI2MD_MAX_PAGE_BYTES={MAX_PAGE_BYTES:,} バイト）までに"
+                                        "本文が見つかりませんでした。上限が小さすぎます。")
+                    else:
+                        result.error = "エラー: コンテンツエリアが見つかりませんでした。"
+                    result.error_stage = "parse"
+                    return result
+
+                # 4. 省メモリモードでは変換に使わない要素を先に取り除く
+                #    （<dt>の見出し化などの整形は、5. の変換中に行う）
+                if LOW_MEMORY:
+                    with record_stage("transform", result):
+                        prune_content_tree(content_div)
+
+                # 5. ツリーを1回たどってMarkdownに変換（省メモリモードでは変換し終えた要素から解放する）
+                with record_stage("convert", result) as stage:
+                    body = convert_body_to_markdown(content_div, rules, following, release=LOW_MEMORY)
+                    stage.bytes = len(body.encode('utf-8'))
+                if LOW_MEMORY:
+                    # ツリーは親子の循環参照を持つため、ガベージコレクションを待たずに解放する
+                    content_div.decompose()
+                del content_div, following
+
+            # 6. タイトルと整形後の本文を結合
+            with record_stage("postprocess", result) as stage:
+                final_markdown = finish_markdown(page_title, body)
+                del body
+                if result.truncated:
+                    final_markdown += TRUNCATION_NOTICE.format(max_bytes=MAX_PAGE_BYTES)
+                stage.bytes = len(final_markdown.encode('utf-8'))
+                if cache:
+                    cache.put('markdown', markdown_key, final_markdown)
+
+            result.markdown = final_markdown
+            result.title = page_title
+            return result
+
+        except requests.exceptions.RequestException as e:
+            result.error = f"HTTPリクエストエラー: {e}"
+        except MediaWikiAPIError as e:
+            result.error = f"エラー: {e}"
+        except Exception as e:
+            result.error = f"予期せぬエラーが発生しました: {e}"
+        finally:
+            default_registry.count_page("ok" if result.ok else "error", result.cache_hit)
+        return result
+
+def scrape_wikipedia_to_markdown_final(url: str, backend=None, revision=None) -> str:
+    """
+    Wikipediaページをスクレイピングし、整形・不要部分削除を行い、
+    タイトルを付けてMarkdownに変換します。
+
+    convert_url() の結果のうち、Markdown（失敗した場合はエラーメッセージ）だけを返します。
+
+    Args:
+        url (str): スクレイピング対象のWikipediaページのURL。
+        backend (str): 取得方式（"html" / "api"）。省略時は DEFAULT_FETCH_BACKEND。
+        revision: 取得する版ID（分かっている場合）。
+
+    Returns:
+        str: 整形・変換された最終的なMarkdownコンテンツ。失敗した場合はエラーメッセージ。
+    """
+    result = convert_url(url, backend, revision)
+    return result.markdown if result.ok else result.error
+
+def desktop_url(url):
+    """モバイル版のホスト（ja.m.wikipedia.org）のURLをPC版のホストにする関数（それ以外はそのまま返す）"""
+    parsed = urlparse(url)
+    mobile_match = MOBILE_HOST_PATTERN.match(parsed.netloc.lower())
+    if not mobile_match:
+        return url
+    return urlunparse(parsed._replace(netloc=f"{mobile_match.group(1)}.{mobile_match.group(2)}"))
+
+def canonicalize_url(url):
+    """
+    同じページを指すURLを1つの形にそろえる関数
+
+    - モバイル版のホスト（ja.m.wikipedia.org）をPC版にする
+    - /w/index.php?title=タイトル 形式を /wiki/タイトル 形式にする
+    - タイトルのパーセントエンコード・空白とアンダースコア・先頭の大文字小文字をそろえる
+    - クエリ（?oldid= や ?action=raw など）は並び順をそろえて残し、#フラグメントを除く
+
+    同じページかどうかの判定とキャッシュキーに使うためのもので、取得には元のURL（モバイル版はPC版のホストにしたもの）を使います。
+    記事以外のURL（タイトルが分からないもの）は #フラグメントだけを除いて返します。
+    """
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower()
+    mobile_match = MOBILE_HOST_PATTERN.match(host)
+    if mobile_match:
+        host = f"{mobile_match.group(1)}.{mobile_match.group(2)}"
+    # WikipediaはHTTPSのみで配信されている
+    scheme = "https" if host.endswith("wikipedia.org") else parsed.scheme.lower()
+    params = parse_qsl(parsed.query, keep_blank_values=True)
+
+    if parsed.path.startswith('/wiki/'):
+        title = unquote(parsed.path[len('/wiki/'):])
+    elif any(name == 'title' and value for name, value in params):
+        title = next(value for name, value in params if name == 'title' and value)
+        params = [(name, value) for name, value in params if name != 'title']
+    else:
+        return urlunparse((scheme, host, parsed.path, parsed.params, parsed.query, ''))
+
+    # MediaWikiと同じく、空白はアンダースコアにし、先頭の文字を大文字にする
+    # （"ß" → "SS" のように大文字にすると文字数が変わる場合は別のページになるためそのままにする）
+    title = re.sub(r'[\s_]+', '_', title).strip('_')
+    if title and len(title[0].upper()) == 1:
+        title = title[0].upper() + title[1:]
+    canonical = f"{scheme}://{host}/wiki/{quote(title, safe=TITLE_SAFE_CHARS)}"
+    if params:
+        canonical += "?" + urlencode(sorted(params))
+    return canonical
+
+def article_url_or_none(href, base_url):
+    """
+    リンク先が同じWikiの記事であれば、そろえたURLを返す関数（記事でなければNone）
+
+    名前空間付きのページ（ファイル・カテゴリ・ノートなど）と、版・差分・編集などの
+    クエリ付きのリンクは記事として扱いません。名前空間の名前はリンク元の言語版のルールセット
+    （rules.RuleSet.namespaces）と英語の名前で判定します。
+    """
+    absolute = urljoin(base_url, href)
+    parsed = urlparse(absolute)
+    if parsed.netloc.lower() != urlparse(base_url).netloc.lower() or not parsed.path.startswith('/wiki/'):
+        return None
+    if parsed.query:
+        return None
+    title = unquote(parsed.path[len('/wiki/'):])
+    if not title or not rules_for_url(base_url).is_article_title(title):
+        return None
+    return canonicalize_url(absolute)
+
+def extract_article_links(content_div, base_url):
+    """
+    本文の<div>からリンクしている記事のURLを出現順に重複なく返す関数
+
+    Args:
+        content_div (Tag): 本文の <div class="mw-parser-output">。
+        base_url (str): ページのURL（相対リンクの解決に使います）。
+
+    Returns:
+        list: そろえた記事のURLのリスト（#フラグメントは除きます）。
+    """
+    links = {}
+    for anchor in content_div.find_all('a', href=True):
+        url = article_url_or_none(anchor['href'], base_url)
+        if url is not None:
+            links.setdefault(url, None)
+    return list(links)
+
+def get_filename_from_url(url):
+    """URLからファイル名を生成する関数"""
+    try:
+        # URLからページ名を抽出（/w/index.php?title= 形式は /wiki/ 形式と同じ名前になる）
+        parsed_url = urlparse(url)
+        if not parsed_url.path.startswith('/wiki/'):
+            parsed_url = urlparse(canonicalize_url(url))
+        page_name = parsed_url.path.split('/')[-1]
+        # URLデコード
+        page_name = unquote(page_name)
+        # ファイル名として使用できない文字を置換
+        safe_filename = re.sub(r'[<>:"/\\|?*]', '_', page_name)
+        return f"{safe_filename}.md"
+    except:
+        return "wikipedia_page.md"
+
+def extract_title(markdown_content):
+    """変換結果の先頭の「# タイトル」からページタイトルを取り出す関数"""
+    title_match = re.match(r'^# (.+)', markdown_content)
+    return title_match.group(1) if title_match else "不明なページ"
+
+def convert_batch_url(url, backend=None, revision=None):
+    """一括処理の1件分を処理し、(結果メッセージのリスト, Markdown) を返す関数"""
+    # URLの検証
+    if not url.startswith('http'):
+        return [f"❌ 無効なURL: {url}"], None
+
+    if 'wikipedia.org' not in url:
+        return [f"❌ Wikipedia以外のURL: {url}"], None
+
+    # スクレイピング実行
+    try:
+        result = convert_url(url, backend, revision)
+        if not result.ok:
+            return [f"❌ 処理失敗: {url}\n   エラー: {result.error}"], None
+        markdown_content = result.markdown
+
+        # ページタイトル
+        page_title = result.title
+
+        # 文字数とファイル情報を表示
+        char_count = len(markdown_content)
+        filename = get_filename_from_url(url)
+
+        lines = [
+            f"✅ 処理成功: {url}",
+            f"   📄 ページタイトル: {page_title}",
+            f"   📊 文字数: {char_count:,} 文字",
+            f"   💾 ファイル名: {filename}",
+        ]
+        return lines, markdown_content
+    except Exception as e:
+        return [f"❌ 処理エラー: {url}", f"   エラー内容: {str(e)}"], None
+
+def prefetch_revisions(urls):
+    """
+    一括処理の対象URLの最新の版IDを、APIごとにまとめて問い合わせる関数
+
+    Returns:
+        dict: URL → 版ID（取得できなかったURLは含まれません）
+    """
+    titles_by_endpoint = {}
+    for url in urls:
+        if url.startswith('http') and 'wikipedia.org' in url:
+            endpoint, title, oldid = parse_wiki_url(canonicalize_url(url))
+            if title and not oldid:
+                titles_by_endpoint.setdefault(endpoint, []).append((url, title))
+
+    revisions = {}
+    for endpoint, entries in titles_by_endpoint.items():
+        try:
+            resolved = query_revisions(endpoint, [title for _, title in entries])
+        except (requests.exceptions.RequestException, MediaWikiAPIError) as e:
+            # 問い合わせに失敗した場合は各ページの処理時に個別に問い合わせる
+            print(f"版IDの一括取得エラー: {e}")
+            continue
+        for url, title in entries:
+            revid = resolved.get(title, {}).get("revid")
+            if revid:
+                revisions[url] = revid
+    return revisions
+
+def batch_page_key(url, revisions=None):
+    """
+    一括処理で同じページかどうかを判定するキーを返す関数
+
+    基本は canonicalize_url() でそろえたURLです。版IDが分かっている場合は
+    (APIのURL, 版ID) をキーにするため、リダイレクトで同じ記事になるURLも同じキーになります。
+    """
+    if not url.startswith('http'):
+        return url
+    canonical = canonicalize_url(url)
+    revid = (revisions or {}).get(url)
+    if revid:
+        endpoint, _, _ = parse_wiki_url(canonical)
+        return (endpoint, revid)
+    return canonical
+
+def run_batch(urls, max_workers=DEFAULT_MAX_WORKERS, backend=None, on_done=None, should_cancel=None,
+              directory=None):
+    """
+    URLのリストを一括処理し、ZIPと結合ファイルに書き出す関数
+
+    同じページを指すURL（表記揺れ・モバイル版・リダイレクトなど）は最初の1件だけを
+    取得・変換し、2件目以降は重複として結果の行だけを出力します（最初の1件が失敗した場合は
+    同じエラーの失敗として数えます）。
+
+    Args:
+        urls (list): WikipediaのURLのリスト。
+        max_workers (int): 並列数。
+        backend (str): 取得方式（"html" / "api"）。
+        on_done: 1件完了するごとに (完了件数, 総件数) で呼ばれるコールバック。
+        should_cancel: Trueを返すと残りの処理を中断する関数。
+        directory (str): 出力先ディレクトリ（省略時は一時ディレクトリ）。
+
+    Returns:
+        tuple: (結果のテキスト, 結合ファイルのパス, 個別ファイルのパスのリスト, ZIPファイルのパス,
+                処理した入力URLの件数（重複を含む。キャンセルした場合は総件数より少ない）)
+    """
+    results = []
+    total_urls = len(urls)
+    success_count = 0
+    cache = get_cache()
+    cache_stats_before = cache.stats() if cache else {}
+
+    # APIで取得する場合は版IDをまとめて問い合わせておく（キャッシュキーにもなる）
+    backend = backend or DEFAULT_FETCH_BACKEND
+    revisions = prefetch_revisions(urls) if backend == "api" else {}
+
+    # 取得を始める前に同じページを指すURLをまとめる（キー → 最初のURL）
+    first_urls = {}
+    duplicates = {}
+    for url in urls:
+        key = batch_page_key(url, revisions)
+        if key in first_urls:
+            duplicates.setdefault(first_urls[key], []).append(url)
+        else:
+            first_urls[key] = url
+    work_urls = list(first_urls.values())
+    duplicate_count = 0
+
+    # 進捗は重複分も含めた入力URLの件数で通知する（i件目まで完了 → 入力URLの完了件数）
+    done_counts = [0]
+    for url in work_urls:
+        done_counts.append(done_counts[-1] + 1 + len(duplicates.get(url, ())))
+
+    def convert(url):
+        return convert_batch_url(url, backend, revisions.get(url))
+
+    def report_done(done, total):
+        if on_done is not None:
+            on_done(done_counts[done], total_urls)
+
+    # 複数ページを並列に取得・変換し、入力順に受け取った結果をそのままZIPと結合ファイルに書き込む
+    processed_count = 0
+    with StreamingExporter(directory) as exporter:
+        for url, (lines, markdown_content) in iter_batch(
+            convert, work_urls, max_workers=max_workers, on_done=report_done
+        ):
+            results.extend(lines)
+            processed_count += 1
+            if markdown_content is not None:
+                with record_stage("write") as stage:
+                    exporter.add(get_filename_from_url(url), markdown_content)
+                    stage.bytes = len(markdown_content.encode('utf-8'))
+                success_count += 1
+            for duplicate_url in duplicates.get(url, ()):
+                processed_count += 1
+                if markdown_content is None:
+                    # 最初のURLのエラー内容（1行目の後）をそのまま付ける
+                    error_detail = "\n".join(lines).partition("\n")[2]
+                    results.append(f"❌ 重複URL: {duplicate_url}\n   {url} と同じページのため同じエラーで失敗しました"
+                                   + (f"\n{error_detail}" if error_detail else ""))
+                    continue
+                results.append(f"♻️ 重複URL: {duplicate_url}\n   {url} と同じページのため省略しました")
+                duplicate_count += 1
+            if should_cancel is not None and should_cancel():
+                break
+
+    # サマリー情報を追加
+    summary = [
+        "=" * 60,
+        "📊 処理結果サマリー",
+        "=" * 60,
+        f"🔗 処理対象URL数: {total_urls}",
+        f"✅ 成功: {success_count}",
+        f"❌ 失敗: {processed_count - success_count - duplicate_count}",
+    ]
+    if duplicate_count:
+        summary.append(f"♻️ 重複（省略）: {duplicate_count}")
+    if processed_count < total_urls:
+        summary.append(f"⛔ キャンセル: 未処理 {total_urls - processed_count}")
+
+    # この一括処理でのキャッシュのヒット状況
+    if cache:
+        for namespace, label in (("html", "HTML"), ("markdown", "Markdown")):
+            after = cache.stats().get(namespace, {})
+            before = cache_stats_before.get(namespace, {})
+            hits = sum(after.get(k, 0) - before.get(k, 0) for k in ("memory_hits", "disk_hits"))
+            misses = after.get("misses", 0) - before.get("misses", 0)
+            summary.append(f"🗃️ キャッシュ（{label}）: ヒット {hits} / ミス {misses}")
+    summary.append("")
+    
+    # 結果を結合
+    final_result = "\n".join(summary + results)
+    
+    return final_result, exporter.combined_path, exporter.preview_paths, exporter.zip_path, processed_count
@@ -0,0 +1,291 @@
+"""
+リンクをたどる一括変換（クローラー）
+
+起点のURLから本文中の記事へのリンクを幅優先でたどり、指定した深さとページ数まで
+Markdownに変換してディレクトリに書き出します。最後に、変換したページ同士へのリンクを
+出力したMarkdownファイルへの相対リンクに書き換えます。
+
+ページの取得は一括処理と同じ並列取得エンジン・ホストごとのレート制限を使います。
+
+使い方:
+    python crawler.py https://ja.wikipedia.org/wiki/Python -o output/ --depth 2 --max-pages 200
+    python crawler.py seeds.txt -o output/ --depth 1 --prefer "言語|Language"
+"""
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import os
+import re
+import sys
+import time
+from urllib.parse import urljoin, urlparse
+
+from batch import DEFAULT_MAX_WORKERS, iter_batch
+from cli import read_urls
+from core import article_url_or_none, canonicalize_url, convert_url, get_filename_from_url
+from mediawiki_api import DEFAULT_FETCH_BACKEND, FETCH_BACKENDS
+from metrics import default_registry, format_summary, record_stage
+
+# クロールの既定値（環境変数で上書き可能）
+CRAWL_DEPTH = int(os.environ.get("WIKI2MD_CRAWL_DEPTH", "1"))
+CRAWL_MAX_PAGES = int(os.environ.get("WIKI2MD_CRAWL_MAX_PAGES", "100"))
+# 見つけたURLの数がこれを超えると見込まれる場合は、訪問済みの判定にブルームフィルターを使う
+BLOOM_THRESHOLD = int(os.environ.get("WIKI2MD_CRAWL_BLOOM_THRESHOLD", "100000"))
+# ブルームフィルターの偽陽性率（訪問済みと誤判定されたページはたどらない）
+BLOOM_ERROR_RATE = float(os.environ.get("WIKI2MD_CRAWL_BLOOM_ERROR_RATE", "0.001"))
+# 1ページあたりのリンク数の見込み（訪問済みの集合の大きさの見積もりに使う）
+LINKS_PER_PAGE = 300
+
+# 出力先ディレクトリに保存するクロール結果の一覧
+CRAWL_INDEX_FILENAME = ".wiki2md_crawl.json"
+
+# html2text が出力するリンク: [テキスト](リンク先 "タイトル")（括弧は \( \) でエスケープされる）
+MARKDOWN_LINK_PATTERN = re.compile(r'\]\(((?:\\.|[^\s()\\])+)((?: "(?:\\.|[^"\\])*")?)\)')
+
+
+class BloomFilter:
+    """
+    訪問済みのURLをビット配列で覚える集合（追加と判定のみ）
+
+    capacity 件を追加したときの偽陽性率が error_rate になる大きさで確保します。
+    URLそのものを保存しないため、数百万件でも数MB程度で済みます。
+    """
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+
+    def _positions(self, item):
+        # 2つのハッシュ値の組み合わせで hash_count 個の位置を作る（Kirsch–Mitzenmacher法）
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def __len__(self):
+        return self._count
+
+
+def make_visited_set(expected_urls):
+    """見つかるURLの見込み数に応じて、通常の集合かブルームフィルターを返す関数"""
+    if expected_urls > BLOOM_THRESHOLD:
+        return BloomFilter(expected_urls)
+    return set()
+
+
+class Frontier:
+    """
+    次に取得するURLの優先度付きキュー
+
+    深さの浅い順（幅優先）に取り出し、同じ深さの中では priority の大きい順、
+    同じ優先度なら見つけた順に取り出します。
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+
+    def push(self, url, depth, priority=0.0):
+        heapq.heappush(self._heap, (depth, -priority, next(self._counter), url))
+
+    def pop(self):
+        """(URL, 深さ) を返す"""
+        depth, _, _, url = heapq.heappop(self._heap)
+        return url, depth
+
+    def __len__(self):
+        return len(self._heap)
+
+
+def rewrite_links(markdown_content, page_url, filenames):
+    """
+    変換したページへのリンクを、出力したMarkdownファイルへの相対リンクに書き換える関数
+
+    Args:
+        markdown_content (str): ページのMarkdown。
+        page_url (str): ページのURL（相対リンクの解決に使います）。
+        filenames (dict): そろえたURL → 出力したファイル名。
+    """
+    def replace_link(match):
+        target = re.sub(r'\\(.)', r'\1', match.group(1))
+        url = article_url_or_none(target, page_url)
+        filename = filenames.get(url) if url else None
+        if filename is None:
+            return match.group(0)
+        fragment = urlparse(urljoin(page_url, target)).fragment
+        # ファイル名の空白と括弧はMarkdownのリンクとして読めるようにエスケープする
+        local = filename.replace(" ", "%20").replace("(", r"\(").replace(")", r"\)")
+        if fragment:
+            local += f"#{fragment}"
+        return f"]({local}{match.group(2)})"
+
+    return MARKDOWN_LINK_PATTERN.sub(replace_link, markdown_content)
+
+
+def crawl(seeds, directory, depth=CRAWL_DEPTH, max_pages=CRAWL_MAX_PAGES, max_workers=DEFAULT_MAX_WORKERS,
+          backend=None, priority=None, log=None):
+    """
+    起点のURLからリンクをたどってMarkdownに変換し、directory に書き出す関数
+
+    深さ0（起点）のページから順に、深さごとに幅優先で取得します。取得は並列数の数倍ずつまとめて
+    一括処理と同じエンジンで行い、次に取得するページは Frontier から優先度順に選びます。
+
+    Args:
+        seeds (list): 起点のURLのリスト。
+        directory (str): 出力先ディレクトリ。
+        depth (int): 起点から何回リンクをたどるか（0なら起点のページだけ）。
+        max_pages (int): 取得するページ数の上限（失敗したページも数えます）。
+        max_workers (int): 並列数。
+        backend (str): 取得方式（"html" / "api"）。
+        priority: (URL, 深さ, リンク元のURL, リンク元での出現順) を受け取り、
+            優先度（大きいほど先に取得）を返す関数。省略時は見つけた順。
+        log: 進捗を表示する関数（省略時は表示しません）。
+
+    Returns:
+        dict: クロール結果（出力した一覧ファイルと同じ内容）。
+    """
+    log = log or (lambda *lines: None)
+    backend = backend or DEFAULT_FETCH_BACKEND
+    os.makedirs(directory, exist_ok=True)
+    started_at = time.time()
+
+    frontier = Frontier()
+    visited = make_visited_set(max_pages * LINKS_PER_PAGE)
+    for url in seeds:
+        canonical = canonicalize_url(url)
+        if canonical not in visited:
+            visited.add(canonical)
+            frontier.push(canonical, 0)
+
+    # そろえたURL → 出力したファイル名（リンクの書き換えに使う）
+    filenames = {}
+    used_filenames = set()
+    pages = []
+    failures = []
+
+    def convert(url):
+        return convert_url(url, backend, with_links=True)
+
+    # 並列数の数倍ずつまとめて取得し、見つけたリンクを次に取得する候補に加える
+    wave_size = max(1, max_workers) * 4
+    while frontier and len(pages) + len(failures) < max_pages:
+        wave = []
+        while frontier and len(wave) < min(wave_size, max_pages - len(pages) - len(failures)):
+            wave.append(frontier.pop())
+        depths = dict(wave)
+
+        for url, result in iter_batch(convert, [url for url, _ in wave], max_workers=max_workers):
+            page_depth = depths[url]
+            if not result.ok:
+                failures.append({"url": url, "depth": page_depth, "error": result.error})
+                log(f"❌ {url}: {result.error}")
+                continue
+
+            filename = _unique_filename(get_filename_from_url(url), used_filenames)
+            with record_stage("write") as stage:
+                with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+                    f.write(result.markdown)
+                stage.bytes = len(result.markdown.encode("utf-8"))
+            filenames[url] = filename
+            pages.append({"url": url, "title": result.title, "filename": filename, "depth": page_depth})
+            log(f"✅ [{page_depth}] {url}")
+
+            if page_depth >= depth:
+                continue
+            for position, link in enumerate(result.links or ()):
+                if link in visited:
+                    continue
+                visited.add(link)
+                frontier.push(link, page_depth + 1,
+                              priority(link, page_depth + 1, url, position) if priority else 0.0)
+
+    # 変換したページ同士のリンクを、出力したファイルへの相対リンクに書き換える
+    for page in pages:
+        path = os.path.join(directory, page["filename"])
+        with open(path, encoding="utf-8") as f:
+            markdown_content = f.read()
+        rewritten = rewrite_links(markdown_content, page["url"], filenames)
+        if rewritten != markdown_content:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(rewritten)
+
+    report = {
+        "started_at": started_at,
+        "finished_at": time.time(),
+        "seeds": list(seeds),
+        "depth": depth,
+        "max_pages": max_pages,
+        "backend": backend,
+        "pages": pages,
+        "failures": failures,
+        "remaining": len(frontier),
+    }
+    with open(os.path.join(directory, CRAWL_INDEX_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def _unique_filename(filename, used_filenames):
+    """同名のファイルには連番を付ける（export.StreamingExporter と同じ規則）"""
+    name, extension = os.path.splitext(filename)
+    candidate = filename
+    index = 2
+    while candidate in used_filenames:
+        candidate = f"{name}_{index}{extension}"
+        index += 1
+    used_filenames.add(candidate)
+    return candidate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="起点のWikipediaページからリンクをたどってMarkdownに変換します")
+    parser.add_argument("seeds", nargs="+", help="起点のURL、またはURLリストのファイル（1行に1つ）")
+    parser.add_argument("-o", "--output-dir", required=True, help="Markdownファイルの出力先ディレクトリ")
+    parser.add_argument("-d", "--depth", type=int, default=CRAWL_DEPTH, help="起点からリンクをたどる回数")
+    parser.add_argument("-n", "--max-pages", type=int, default=CRAWL_MAX_PAGES, help="取得するページ数の上限")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_MAX_WORKERS, help="並列数")
+    parser.add_argument("--backend", choices=FETCH_BACKENDS, default=DEFAULT_FETCH_BACKEND, help="取得方式")
+    parser.add_argument("--prefer", help="同じ深さの中で先に取得するページのURL・タイトルの正規表現")
+    parser.add_argument("-q", "--quiet", action="store_true", help="ページごとの結果を表示しない")
+    args = parser.parse_args(argv)
+
+    seeds = []
+    for seed in args.seeds:
+        seeds.extend([seed] if seed.startswith("http") else read_urls(seed))
+
+    priority = None
+    if args.prefer:
+        pattern = re.compile(args.prefer)
+
+        def priority(url, depth, source, position):
+            return 1.0 if pattern.search(get_filename_from_url(url)) or pattern.search(url) else 0.0
+
+    log = (lambda *lines: None) if args.quiet else (lambda *lines: print(*lines, sep="\n", file=sys.stderr))
+    start = time.perf_counter()
+    report = crawl(seeds, args.output_dir, args.depth, args.max_pages, args.workers, args.backend, priority, log)
+    elapsed = time.perf_counter() - start
+    print(
+        f"完了: 変換 {len(report['pages'])} ページ / 失敗 {len(report['failures'])} 件 / 未取得 {report['remaining']} 件"
+        f"（{elapsed:.1f} 秒）",
+        file=sys.stderr,
+    )
+    log(*format_summary(default_registry.summary()))
+    return 1 if report["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
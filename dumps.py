@@ -0,0 +1,304 @@
+"""
+オフラインのダンプファイルからの一括変換
+
+Wikimedia Enterprise の HTMLダンプ（NDJSONを固めた .tar.gz）などのダンプファイルを
+ストリームとして読み込み、複数プロセスでMarkdownに変換してJSONLの分割ファイルに書き出します。
+変換規則（<dt>の見出し化・「## 脚注」以降の除外・[編集]リンクの削除）はWeb版と同じです。
+
+対応する入力:
+    - *.tar.gz / *.tgz     Wikimedia Enterprise の HTMLダンプ（中の *.ndjson / *.json を順に読み込みます）
+    - *.ndjson.gz / *.jsonl.gz / *.ndjson / *.jsonl  1行1記事のJSON
+各記事は Enterprise の形式（name / url / version.identifier / article_body.html / in_language.identifier）のほか、
+title / html を持つ単純なJSONでも構いません。
+整形ルール（rules.py）は記事のURLのホスト、なければダンプに書かれた言語版から選びます。
+URLも言語版も持たないダンプでは --rules で指定します（例: --rules en）。
+（XMLダンプはウィキテキストでありHTMLを含まないため対象外です）
+
+使い方:
+    python dumps.py jawiki-NS0-ENTERPRISE-HTML.json.tar.gz -o output/
+    python dumps.py part1.ndjson.gz part2.ndjson.gz -o output/ --workers 8 --shard-size 5000 --gzip
+    python dumps.py enwiki-pages.ndjson -o output/ --rules en
+"""
+import argparse
+import functools
+import gzip
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import threading
+import time
+
+from core import CONVERTER_OPTIONS, convert_content_to_markdown
+from parsing import parse_wikipedia_html
+from rules import RULE_SETS, get_rules, rules_for_language, rules_for_url
+
+# 1つの分割ファイルに書き込む記事数
+DEFAULT_SHARD_SIZE = int(os.environ.get("WIKI2MD_DUMP_SHARD_SIZE", "10000"))
+
+# 進捗を表示する間隔（記事数）
+REPORT_EVERY = 1000
+
+DUMP_MEMBER_SUFFIXES = (".ndjson", ".json", ".jsonl")
+
+
+def iter_dump_lines(path):
+    """ダンプファイルの各行（1記事分のJSON文字列）を順に返す関数"""
+    if path.endswith((".tar.gz", ".tgz")):
+        # 展開せずにストリームとして先頭から読み込む
+        with tarfile.open(path, "r|gz") as archive:
+            for member in archive:
+                if not member.isfile() or not member.name.endswith(DUMP_MEMBER_SUFFIXES):
+                    continue
+                for line in archive.extractfile(member):
+                    yield line.decode("utf-8")
+    elif path.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            yield from f
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from f
+
+
+def record_to_article(record):
+    """
+    ダンプの1記事分のJSONから (タイトル, URL, 版ID, HTML, 言語版) を取り出す関数（HTMLがなければNone）
+
+    言語版は in_language.identifier（"ja"）、なければ is_part_of.identifier（"jawiki"）から取り出します。
+    """
+    body = record.get("article_body") or {}
+    html = body.get("html") or record.get("html")
+    if not html:
+        return None
+    title = record.get("name") or record.get("title") or "Wikipedia ページ"
+    revid = (record.get("version") or {}).get("identifier") or record.get("revid")
+    language = (record.get("in_language") or {}).get("identifier") or record.get("language")
+    if not language:
+        wiki = (record.get("is_part_of") or {}).get("identifier") or ""
+        language = wiki[:-len("wiki")] if wiki.endswith("wiki") else None
+    return title, record.get("url"), revid, html, language
+
+
+class DumpRecordError(ValueError):
+    """ダンプの1行を記事として読み込めなかった場合のエラー"""
+
+
+def iter_dump_articles(paths):
+    """
+    複数のダンプファイルから記事を順に返す関数（ウィキテキスト等の不要な項目は渡しません）
+
+    JSONとして読み込めない行は、中断せずに DumpRecordError を記事の代わりに返します
+    （convert_article() が失敗した記事として扱います）。
+    """
+    for path in paths:
+        for line_number, line in enumerate(iter_dump_lines(path), 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield DumpRecordError(f"{path}:{line_number}: JSONを読み込めませんでした: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield DumpRecordError(f"{path}:{line_number}: 記事のJSONではありません")
+                continue
+            article = record_to_article(record)
+            if article is not None:
+                yield article
+
+
+def article_rules(url, language, rules=None):
+    """
+    記事に使う整形ルールを返す関数
+
+    rules（ルールセットの名前）を指定すればそのルールセット、なければ記事のURLのホスト、
+    URLがなければダンプに書かれた言語版のルールセットを使います。
+    """
+    if rules:
+        return get_rules(rules)
+    if url:
+        return rules_for_url(url)
+    return rules_for_language(language)
+
+
+def convert_article(article, rules=None):
+    """
+    1記事分のHTMLをMarkdownに変換する関数（ワーカープロセスで実行されます）
+
+    Args:
+        article: iter_dump_articles() が返す記事。
+        rules (str): 使用するルールセットの名前（省略時は article_rules() で選びます）。
+
+    Returns:
+        tuple: (出力するレコード, エラーメッセージ)。どちらか一方はNone。
+    """
+    if isinstance(article, DumpRecordError):
+        return None, str(article)
+    title, url, revid, html, language = article
+    try:
+        # Parsoid のHTML（Enterpriseのダンプ）は <div class="mw-parser-output"> を持たず、<body> が本文になる
+        _, content_div = parse_wikipedia_html(html, CONVERTER_OPTIONS["parser"], body_fallback=True)
+        if content_div is None:
+            return None, f"{title}: コンテンツエリアが見つかりませんでした。"
+        markdown = convert_content_to_markdown(title, content_div, article_rules(url, language, rules))
+        return {"title": title, "url": url, "revid": revid, "markdown": markdown}, None
+    except Exception as e:
+        return None, f"{title}: {e}"
+
+
+class ShardedJsonlWriter:
+    """記事を shard_size 件ごとに part-00000.jsonl, part-00001.jsonl, ... へ書き出すクラス"""
+
+    def __init__(self, directory, shard_size=DEFAULT_SHARD_SIZE, compress=False):
+        self.directory = directory
+        self.shard_size = max(1, shard_size)
+        self.compress = compress
+        self.paths = []
+        self._file = None
+        self._count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, record):
+        if self._file is None or self._count >= self.shard_size:
+            self._open_next()
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open_next(self):
+        self.close()
+        name = f"part-{len(self.paths):05d}.jsonl" + (".gz" if self.compress else "")
+        path = os.path.join(self.directory, name)
+        self._file = gzip.open(path, "wt", encoding="utf-8") if self.compress else open(path, "w", encoding="utf-8")
+        self.paths.append(path)
+        self._count = 0
+
+
+def _bounded(iterable, semaphore, stopped):
+    """
+    セマフォを取得してから要素を渡す（Pool.imap が入力を先読みしすぎないようにする）
+
+    stopped が設定されたら入力の読み込みをやめます。Pool のタスク送信スレッドで実行されるため、
+    セマフォを待ったまま止まっていると Pool.terminate() が終わらなくなります。
+    """
+    for item in iterable:
+        semaphore.acquire()
+        if stopped.is_set():
+            return
+        yield item
+
+
+def convert_dumps(paths, output_dir, workers=None, shard_size=DEFAULT_SHARD_SIZE, compress=False,
+                  limit=None, log=None, rules=None):
+    """
+    ダンプファイルの記事を複数プロセスで変換し、分割したJSONLに書き出す関数
+
+    入力は先頭から順に読み込み、変換待ちの記事は workers の数に比例した件数までに抑えるため、
+    ダンプ全体の大きさに関わらずメモリ使用量は一定です。出力は入力と同じ順序になります。
+
+    Args:
+        paths (list): ダンプファイルのパス。
+        output_dir (str): 出力先ディレクトリ。
+        workers (int): ワーカープロセス数。省略時はCPU数。1ならプロセスを作りません。
+        shard_size (int): 1つの分割ファイルの記事数。
+        compress (bool): 分割ファイルをgzipで圧縮するか。
+        limit (int): 変換する記事数の上限（お試し用）。
+        log: 進捗メッセージを受け取る関数。
+        rules (str): 全ての記事に使うルールセットの名前（省略時は記事のURL・言語版から選びます）。
+
+    Returns:
+        dict: 変換件数・失敗件数・経過秒数・記事/秒・出力ファイルの一覧。
+    """
+    log = log or (lambda message: None)
+    workers = max(1, workers or os.cpu_count() or 1)
+    articles = iter_dump_articles(paths)
+    if limit:
+        articles = itertools.islice(articles, limit)
+
+    writer = ShardedJsonlWriter(output_dir, shard_size, compress)
+    converted = failed = 0
+    start = time.perf_counter()
+
+    def report():
+        elapsed = time.perf_counter() - start
+        rate = converted / elapsed if elapsed else 0.0
+        log(f"{converted:,} 件変換（失敗 {failed:,} 件、{rate:,.1f} 記事/秒）")
+        return elapsed, rate
+
+    convert = functools.partial(convert_article, rules=rules)
+    pool = None
+    try:
+        if workers == 1:
+            results = map(convert, articles)
+            window = None
+        else:
+            chunksize = 4
+            window = threading.Semaphore(workers * chunksize * 4)
+            stopped = threading.Event()
+            pool = multiprocessing.Pool(workers)
+            results = pool.imap(convert, _bounded(articles, window, stopped), chunksize)
+
+        for record, error in results:
+            if window is not None:
+                window.release()
+            if error:
+                failed += 1
+                log(f"❌ {error}")
+            else:
+                writer.write(record)
+                converted += 1
+            if (converted + failed) % REPORT_EVERY == 0:
+                report()
+    finally:
+        writer.close()
+        if pool is not None:
+            # 書き込みエラーや中断で抜けた場合も、セマフォを待っている入力の読み込みを止めてから終了する
+            stopped.set()
+            window.release()
+            pool.terminate()
+            pool.join()
+
+    elapsed, rate = report()
+    return {
+        "converted": converted,
+        "failed": failed,
+        "seconds": elapsed,
+        "articles_per_second": rate,
+        "shards": writer.paths,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ダンプファイルの記事をまとめてMarkdownに変換します")
+    parser.add_argument("paths", nargs="+", help="ダンプファイル（.tar.gz / .ndjson.gz / .ndjson）")
+    parser.add_argument("-o", "--output-dir", required=True, help="分割したJSONLの出力先ディレクトリ")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="ワーカープロセス数（省略時はCPU数）")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="1ファイルあたりの記事数")
+    parser.add_argument("--gzip", action="store_true", help="出力をgzipで圧縮する")
+    parser.add_argument("--limit", type=int, default=None, help="変換する記事数の上限")
+    parser.add_argument("--rules", choices=sorted(RULE_SETS), default=None,
+                        help="全ての記事に使う整形ルール（省略時は記事のURL・ダンプの言語版から選択）")
+    args = parser.parse_args(argv)
+
+    summary = convert_dumps(
+        args.paths, args.output_dir, workers=args.workers, shard_size=args.shard_size,
+        compress=args.gzip, limit=args.limit, log=lambda message: print(message, file=sys.stderr),
+        rules=args.rules,
+    )
+    print(
+        f"完了: {summary['converted']:,} 件変換 / 失敗 {summary['failed']:,} 件 / "
+        f"{summary['seconds']:.1f} 秒 / {summary['articles_per_second']:,.1f} 記事/秒 / "
+        f"{len(summary['shards'])} ファイル",
+        file=sys.stderr,
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import zipfile
+
+# 一括処理の結果ファイル名
+COMBINED_FILENAME = "wikipedia_batch_export.md"
+ZIP_FILENAME = "wikipedia_export.zip"
+
+# 結合ファイルの先頭に入れる区切り
+COMBINED_HEADER = "\n\n" + "=" * 80
+
+# 個別ダウンロード用に書き出すファイル数（UIに表示できる数）
+DEFAULT_PREVIEW_COUNT = 5
+
+
+class StreamingExporter:
+    """
+    一括処理の結果を、変換が終わったページから順にZIPと結合ファイルへ書き込むクラス
+
+    ページのMarkdownを溜めずにその場で書き込むため、ページ数が増えても
+    メモリ使用量は1ページ分で一定です。ページごとの一時ファイルは作らず、
+    個別ダウンロード用には先頭の preview_count 件だけを書き出します。
+
+    使い方:
+        with StreamingExporter() as exporter:
+            for filename, content in pages:
+                exporter.add(filename, content)
+        exporter.combined_path, exporter.zip_path, exporter.preview_paths
+    """
+
+    def __init__(self, directory=None, combined_filename=COMBINED_FILENAME,
+                 zip_filename=ZIP_FILENAME, preview_count=DEFAULT_PREVIEW_COUNT):
+        # 一括処理ごとに専用のディレクトリを作り、同時に実行された処理と混ざらないようにする
+        self._owns_directory = directory is None
+        self.directory = directory or tempfile.mkdtemp(prefix="wikipedia_export_")
+        os.makedirs(self.directory, exist_ok=True)
+        self.preview_count = preview_count
+        self.count = 0
+        self.preview_paths = []
+        self._names = set()
+
+        self.combined_path = os.path.join(self.directory, combined_filename)
+        self.zip_path = os.path.join(self.directory, zip_filename)
+        self._combined = open(self.combined_path, 'w', encoding='utf-8')
+        self._zip = zipfile.ZipFile(self.zip_path, 'w', zipfile.ZIP_DEFLATED)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, filename, content):
+        """
+        1ページ分のMarkdownを書き込む関数
+
+        Returns:
+            str: ZIP内のファイル名（同名のファイルがあれば連番を付けます）。
+        """
+        name = self._unique_name(filename)
+        self._zip.writestr(name, content)
+
+        # 結合ファイルは従来と同じ形式（先頭に区切り、ページ間は空行）で書き込む
+        self._combined.write(COMBINED_HEADER if self.count == 0 else "\n\n")
+        self._combined.write(content)
+        self.count += 1
+
+        if len(self.preview_paths) < self.preview_count:
+            preview_path = os.path.join(self.directory, name)
+            with open(preview_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            self.preview_paths.append(preview_path)
+        return name
+
+    def close(self):
+        """ファイルを閉じる関数（1ページも書き込まれなければ出力ファイルを削除します）"""
+        if self._zip is None:
+            return
+        self._zip.close()
+        self._combined.close()
+        self._zip = None
+        if self.count == 0:
+            for path in (self.combined_path, self.zip_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.combined_path = None
+            self.zip_path = None
+            if self._owns_directory:
+                os.rmdir(self.directory)
+
+    def _unique_name(self, filename):
+        name = filename
+        stem, ext = os.path.splitext(filename)
+        number = 2
+        while name in self._names:
+            name = f"{stem}_{number}{ext}"
+            number += 1
+        self._names.add(name)
+        return name
@@ -0,0 +1,229 @@
+import codecs
+import os
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from batch import default_rate_limiter
+
+# HTTPクライアントの既定値（環境変数で上書き可能）
+DEFAULT_TIMEOUT = float(os.environ.get("WIKI2MD_HTTP_TIMEOUT", "30"))
+DEFAULT_POOL_SIZE = int(os.environ.get("WIKI2MD_HTTP_POOL_SIZE", "16"))
+DEFAULT_MAX_RETRIES = int(os.environ.get("WIKI2MD_HTTP_MAX_RETRIES", "3"))
+DEFAULT_BACKOFF_FACTOR = float(os.environ.get("WIKI2MD_HTTP_BACKOFF", "0.5"))
+DEFAULT_VALIDATOR_ENTRIES = int(os.environ.get("WIKI2MD_HTTP_VALIDATOR_ENTRIES", "128"))
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# MediaWiki API へのリクエストに使うUser-Agent（Wikimediaのポリシーに従い連絡先を含める）
+API_USER_AGENT = 'wikipedia-to-markdown/1.0 (https://github.com/Sunwood-ai-labsII/wikipedia-to-markdown)'
+
+# リトライ対象のステータスコード（429とサーバーエラー）
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# 本文を上限付きで読み込むときの1回の読み込みサイズ
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class TruncatedText(str):
+    """上限のバイト数で切り詰めた本文（通常の文字列と区別するための型）"""
+
+
+def truncate_text(text, max_bytes, start=0):
+    """
+    UTF-8で max_bytes を超える文字列を、文字の途中で切れないように切り詰める関数
+
+    start を指定すると、その位置から数えて max_bytes までを残します（それより前は数えません）。
+    大きなページ全体をエンコードしたコピーを作らないよう、STREAM_CHUNK_SIZE 文字ずつ数えます。
+    """
+    remaining = max_bytes
+    for index in range(start, len(text), STREAM_CHUNK_SIZE):
+        encoded = text[index:index + STREAM_CHUNK_SIZE].encode('utf-8')
+        if len(encoded) > remaining:
+            return TruncatedText(text[:index] + encoded[:remaining].decode('utf-8', errors='ignore'))
+        remaining -= len(encoded)
+    return text
+
+
+def utf8_length(text):
+    """文字列をUTF-8にしたときのバイト数を、全体をエンコードしたコピーを作らずに数える関数"""
+    return sum(
+        len(text[index:index + STREAM_CHUNK_SIZE].encode('utf-8'))
+        for index in range(0, len(text), STREAM_CHUNK_SIZE)
+    )
+
+
+def _read_limited(response, max_bytes):
+    """レスポンスを max_bytes まで読み込んで文字列にする（超えた分は受信せずに接続を閉じる）"""
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    pieces = []
+    remaining = max_bytes
+    truncated = False
+    for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+        if len(chunk) > remaining:
+            # 切り詰めた場合は途中で切れた文字を捨てる（final=True で終えない）
+            pieces.append(decoder.decode(chunk[:remaining]))
+            truncated = True
+            break
+        remaining -= len(chunk)
+        pieces.append(decoder.decode(chunk))
+    else:
+        pieces.append(decoder.decode(b'', final=True))
+    response.close()
+    text = ''.join(pieces)
+    return TruncatedText(text) if truncated else text
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, max_retries=DEFAULT_MAX_RETRIES,
+                   backoff_factor=DEFAULT_BACKOFF_FACTOR) -> requests.Session:
+    """
+    コネクションプールとリトライ設定を持つ requests.Session を作成する関数
+
+    Keep-Aliveで接続を再利用し、429/5xxの応答には指数バックオフで
+    リトライします。Retry-Afterヘッダーがあればその秒数だけ待機します。
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """アプリ全体で共有するセッションを返す関数（初回呼び出し時に作成）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+class ValidatorStore:
+    """
+    条件付きリクエスト用に ETag / Last-Modified と本文を保持するLRUストア
+
+    max_entries 件を超えると最も古いエントリから削除します。
+    """
+
+    def __init__(self, max_entries=DEFAULT_VALIDATOR_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """URLに対応する (etag, last_modified, text) を返す（なければNone）"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def put(self, url, etag, last_modified, text):
+        """検証子と本文を保存する"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[url] = (etag, last_modified, text)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+default_validator_store = ValidatorStore()
+
+
+def fetch_text(url, timeout=DEFAULT_TIMEOUT, session=None, rate_limiter=default_rate_limiter,
+               validators=default_validator_store, max_bytes=None) -> str:
+    """
+    URLの本文を取得して文字列で返す関数
+
+    前回取得時の ETag / Last-Modified があれば条件付きGETを送り、
+    304 Not Modified の場合は保存済みの本文を返します。
+
+    Args:
+        url (str): 取得するURL。
+        timeout (float): 接続・読み込みのタイムアウト秒数。
+        session: 使用するセッション。省略時は共有セッション。
+        rate_limiter: ホストごとのレートリミッター。Noneなら制限しない。
+        validators: 条件付きリクエスト用のストア。Noneなら使用しない。
+        max_bytes (int): 本文の最大バイト数。超えた分は受信せず、切り詰めた本文を
+            TruncatedText として返します（条件付きGET用には保存しません）。Noneなら制限しない。
+
+    Returns:
+        str: レスポンス本文。
+
+    Raises:
+        requests.exceptions.RequestException: 通信エラーやHTTPエラーの場合。
+    """
+    session = session or get_session()
+    if rate_limiter is not None:
+        rate_limiter.acquire(url)
+
+    headers = {}
+    cached = validators.get(url) if validators is not None else None
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    response = session.get(url, headers=headers, timeout=timeout, stream=max_bytes is not None)
+    if response.status_code == 304 and cached:
+        # ストリームで受信している場合は、接続をプールに戻すためにここで閉じる
+        response.close()
+        return cached[2]
+    if not response.ok:
+        response.close()
+    response.raise_for_status()  # HTTPエラーがあれば例外を発生させる
+
+    # Content-Typeで文字コードが指定されていない場合のみ自動検出する
+    # （上限付きで読み込む場合は本文全体を読まずに済むようUTF-8とみなす）
+    if 'charset' not in response.headers.get('Content-Type', '').lower():
+        response.encoding = 'utf-8' if max_bytes is not None else response.apparent_encoding
+    if max_bytes is not None:
+        text = _read_limited(response, max_bytes)
+        if isinstance(text, TruncatedText):
+            return text
+    else:
+        text = response.text
+
+    if validators is not None:
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            validators.put(url, etag, last_modified, text)
+    return text
+
+
+def fetch_json(url, params=None, timeout=DEFAULT_TIMEOUT, session=None, rate_limiter=default_rate_limiter):
+    """
+    APIにGETリクエストを送り、JSONレスポンスを辞書で返す関数
+
+    Raises:
+        requests.exceptions.RequestException: 通信エラーやHTTPエラーの場合。
+    """
+    session = session or get_session()
+    if rate_limiter is not None:
+        rate_limiter.acquire(url)
+    response = session.get(url, params=params, headers={'User-Agent': API_USER_AGENT}, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
@@ -0,0 +1,284 @@
+"""
+一括処理のバックグラウンドジョブ
+
+一括処理をジョブとして受け付け、共有のワーカーで順に実行します。
+ジョブの状態はSQLiteに保存されるため、ブラウザを閉じても後から進捗の確認や
+結果のダウンロードができ、プロセスを再起動した場合も未完了のジョブは最初から実行し直されます。
+
+    manager = get_job_manager()
+    job_id = manager.submit(urls, max_workers=4, backend="html")
+    manager.get(job_id)      # {"status": "running", "done": 3, "total": 10, ...}
+    manager.cancel(job_id)
+"""
+import json
+import os
+import queue
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from batch import DEFAULT_MAX_WORKERS
+from core import run_batch
+
+# ジョブの既定値（環境変数で上書き可能）
+JOBS_DIR = os.environ.get(
+    "WIKI2MD_JOBS_DIR", os.path.join(tempfile.gettempdir(), "wikipedia_to_markdown_jobs")
+)
+JOB_WORKERS = int(os.environ.get("WIKI2MD_JOB_WORKERS", "2"))
+JOB_MAX_AGE = float(os.environ.get("WIKI2MD_JOB_MAX_AGE", str(7 * 24 * 60 * 60)))
+
+# ジョブの状態
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+# 進捗をジョブストアに書き込む最短の間隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+_COLUMNS = (
+    "id", "status", "urls", "max_workers", "backend", "total", "done",
+    "created_at", "started_at", "finished_at",
+    "result_text", "combined_path", "zip_path", "preview_paths", "error",
+)
+
+
+class JobStore:
+    """ジョブの状態を保存するSQLiteのストア"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " urls TEXT NOT NULL,"
+            " max_workers INTEGER NOT NULL,"
+            " backend TEXT,"
+            " total INTEGER NOT NULL,"
+            " done INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " result_text TEXT,"
+            " combined_path TEXT,"
+            " zip_path TEXT,"
+            " preview_paths TEXT,"
+            " error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at)")
+        self._conn.commit()
+
+    def create(self, job_id, urls, max_workers, backend):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, urls, max_workers, backend, total, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(urls), max_workers, backend, len(urls), time.time()),
+            )
+            self._conn.commit()
+
+    def update(self, job_id, **fields):
+        if "preview_paths" in fields:
+            fields["preview_paths"] = json.dumps(fields["preview_paths"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def get(self, job_id):
+        """ジョブの状態を辞書で返す（見つからなければNone）"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def recent(self, limit=20):
+        """新しい順にジョブの状態を返す（URLのリストは含めません）"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        jobs = [self._to_dict(row) for row in rows]
+        for job in jobs:
+            del job["urls"]
+        return jobs
+
+    def unfinished(self):
+        """未完了（待機中・実行中）のジョブIDを古い順に返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def delete_finished_before(self, timestamp):
+        """timestamp より前に終了したジョブを削除し、削除したIDを返す"""
+        placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?",
+                (*FINISHED_STATUSES, timestamp),
+            ).fetchall()
+            job_ids = [row[0] for row in rows]
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+            self._conn.commit()
+        return job_ids
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(zip(_COLUMNS, row))
+        job["urls"] = json.loads(job["urls"])
+        job["preview_paths"] = json.loads(job["preview_paths"]) if job["preview_paths"] else []
+        return job
+
+
+class JobManager:
+    """
+    ジョブを受け付けて、共有のワーカーで実行するクラス
+
+    同時に実行するジョブは job_workers 件までで、ジョブごとのページの並列数は
+    max_workers で決まります（全体の並列数は最大 job_workers × max_workers）。
+    ページの取得はホストごとのレート制限を全てのジョブで共有します。
+    """
+
+    def __init__(self, directory=JOBS_DIR, job_workers=JOB_WORKERS, max_age=JOB_MAX_AGE):
+        self.directory = directory
+        self.job_workers = max(1, job_workers)
+        self.max_age = max_age
+        self.store = JobStore(os.path.join(directory, "jobs.sqlite3"))
+        self._queue = queue.Queue()
+        self._cancelled = set()
+        self._cancel_lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """ワーカーを起動し、前回のプロセスで未完了だったジョブを再投入する"""
+        if self._threads:
+            return
+        self.cleanup()
+        for job_id in self.store.unfinished():
+            # 実行途中だったジョブは出力を作り直すため最初から実行する
+            self.store.update(job_id, status=QUEUED, done=0, started_at=None)
+            self._queue.put(job_id)
+        for index in range(self.job_workers):
+            thread = threading.Thread(target=self._work, name=f"wiki2md-job-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, urls, max_workers=DEFAULT_MAX_WORKERS, backend=None):
+        """一括処理のジョブを登録し、ジョブIDを返す"""
+        job_id = uuid.uuid4().hex[:12]
+        self.store.create(job_id, list(urls), int(max_workers), backend)
+        self._queue.put(job_id)
+        return job_id
+
+    def get(self, job_id):
+        """ジョブの状態を返す（見つからなければNone）"""
+        return self.store.get(job_id.strip()) if job_id else None
+
+    def recent(self, limit=20):
+        return self.store.recent(limit)
+
+    def cancel(self, job_id):
+        """
+        ジョブをキャンセルする
+
+        待機中のジョブはすぐに、実行中のジョブは処理中のページが終わった時点で中断します
+        （それまでに変換したページは結果に含まれます）。
+
+        Returns:
+            bool: キャンセルできた場合はTrue（終了済み・存在しない場合はFalse）。
+        """
+        job = self.get(job_id)
+        if job is None or job["status"] in FINISHED_STATUSES:
+            return False
+        with self._cancel_lock:
+            self._cancelled.add(job["id"])
+        if job["status"] == QUEUED:
+            self.store.update(job["id"], status=CANCELLED, finished_at=time.time())
+        return True
+
+    def cleanup(self):
+        """終了してから max_age 秒以上経ったジョブと出力を削除する"""
+        for job_id in self.store.delete_finished_before(time.time() - self.max_age):
+            shutil.rmtree(os.path.join(self.directory, job_id), ignore_errors=True)
+
+    def _is_cancelled(self, job_id):
+        with self._cancel_lock:
+            return job_id in self._cancelled
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            except Exception as e:
+                self.store.update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+            finally:
+                with self._cancel_lock:
+                    self._cancelled.discard(job_id)
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        if job is None or job["status"] != QUEUED or self._is_cancelled(job_id):
+            return
+
+        output_dir = os.path.join(self.directory, job_id)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(output_dir)
+        self.store.update(job_id, status=RUNNING, started_at=time.time())
+
+        last_update = 0.0
+
+        def report_progress(done, total):
+            nonlocal last_update
+            now = time.monotonic()
+            if done == total or now - last_update >= PROGRESS_INTERVAL:
+                last_update = now
+                self.store.update(job_id, done=done)
+
+        result_text, combined_path, preview_paths, zip_path, processed_count = run_batch(
+            job["urls"], job["max_workers"], job["backend"],
+            on_done=report_progress,
+            should_cancel=lambda: self._is_cancelled(job_id),
+            directory=output_dir,
+        )
+        self.store.update(
+            job_id,
+            status=CANCELLED if self._is_cancelled(job_id) else DONE,
+            finished_at=time.time(),
+            # 進捗の書き込みは間引いているため、最後に処理した件数を書き込む
+            done=processed_count,
+            result_text=result_text,
+            combined_path=combined_path,
+            zip_path=zip_path,
+            preview_paths=preview_paths,
+        )
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """アプリ全体で共有するジョブマネージャーを返す関数（初回呼び出し時にワーカーを起動）"""
+    global _default_manager
+    if _default_manager is None:
+        with _default_manager_lock:
+            if _default_manager is None:
+                manager = JobManager()
+                manager.start()
+                _default_manager = manager
+    return _default_manager
@@ -0,0 +1,190 @@
+import re
+from itertools import chain
+
+import html2text
+from bs4.element import NavigableString, PreformattedString, Tag
+
+from rules import get_rules
+
+# テキスト中でエンティティとして扱われる文字（BeautifulSoupの文字列化と同じ）
+ENTITY_SPLIT_PATTERN = re.compile(r'([&<>])')
+ENTITY_NAMES = {'&': 'amp', '<': 'lt', '>': 'gt'}
+
+# 中身をそのままデータとして扱う要素
+RAW_TEXT_TAGS = ('script', 'style')
+
+
+def _attribute_value(value):
+    """class などの複数値の属性をスペース区切りの文字列にする"""
+    return value if isinstance(value, str) else ' '.join(value)
+
+
+class WikipediaMarkdownConverter(html2text.HTML2Text):
+    """
+    解析済みのBeautifulSoupのツリーを1回たどってMarkdownに変換するクラス
+
+    html2text の整形処理はそのまま使い、HTML文字列への再変換と再解析を行いません。
+    従来は変換後にまとめて行っていた整形を、ツリーをたどりながら行います。
+
+    - <dt> は <h4> として変換します。
+    - 「## 脚注」などの出力しない節の見出しを出力し終えた時点で変換を終了します
+      （見出しの文字列がそろってから行全体で判定します）。
+    - [編集]リンクは、その行を改行で終えるときに取り消します。
+    - ナビゲーションボックスなどの取り除く要素は、中身ごとたどりません。
+
+    言語版ごとの違い（節の名前・[編集]リンクの文字列・取り除く要素）は rules（rules.RuleSet）で指定します。
+    """
+
+    def __init__(self, rules=None, body_width=0):
+        super().__init__(bodywidth=body_width)
+        self.rules = rules or get_rules()
+        # 出力中の行に[編集]リンクがあるかどうか
+        self._edit_link_pending = False
+        # 変換中のh2見出しの出力開始位置
+        self._heading_start = None
+
+    def convert(self, content_div, following=(), release=False):
+        """
+        本文の要素をMarkdownに変換する関数
+
+        Args:
+            content_div (Tag): 本文の <div class="mw-parser-output">。
+            following: 本文の続きとして content_div の子要素の後に変換する要素のイテラブル
+                （parsing.parse_wikipedia_sections() で区切って解析した2つ目以降の節）。
+            release (bool): 本文の直下の要素を変換し終えるごとに、そのツリーを解放するかどうか。
+
+        Returns:
+            str: Markdown文字列（前後の空白は除去しません）。
+        """
+        self._walk(content_div, following, release)
+        return self.optwrap(self.finish())
+
+    def outtextf(self, s):
+        if self._edit_link_pending and s:
+            newline = s.find("\n")
+            if newline != -1:
+                self._edit_link_pending = False
+            # 行末の[編集]リンクは、その行を改行で終えるときに改行ごと取り除く
+            if newline == 0 and self._remove_edit_link_at_line_end():
+                self.outtextlist.append(s[1:])
+                self.lastWasNL = s[-1] == "\n"
+                return
+        super().outtextf(s)
+
+    def _remove_edit_link_at_line_end(self):
+        """出力中の行が[編集]リンクで終わっていれば取り除き、Trueを返す"""
+        index = len(self.outtextlist)
+        while index > 0 and "\n" not in self.outtextlist[index - 1]:
+            index -= 1
+        if index > 0:
+            index -= 1
+            head = self.outtextlist[index]
+            cut = head.rfind("\n") + 1
+            prefix, line = head[:cut], head[cut:] + "".join(self.outtextlist[index + 1:])
+        else:
+            prefix, line = "", "".join(self.outtextlist)
+
+        pattern = self.rules.edit_link_pattern
+        match = pattern.search(line + "\n") if pattern is not None else None
+        if match is None or match.end() != len(line) + 1:
+            return False
+        self.outtextlist[index:] = [prefix + line[:match.start()]]
+        if self._heading_start is not None:
+            self._heading_start = min(self._heading_start, index)
+        return True
+
+    def _walk(self, root, following=(), release=False):
+        """ツリーを深さ優先でたどり、html2text のイベントを直接発生させる"""
+        pending_text = []
+        stack = [(None, iter((root,)))]
+        while stack:
+            parent, children = stack[-1]
+            node = next(children, None)
+
+            if node is None:
+                stack.pop()
+                if parent is not None:
+                    self._flush_text(pending_text, parent)
+                    if self._end_element(parent):
+                        return
+                    if release and len(stack) == 2:
+                        # 本文の直下の要素を変換し終えたら、ツリーから外してすぐに解放する
+                        parent.decompose()
+                continue
+
+            if isinstance(node, Tag):
+                if self.rules.removal_classes and self.rules.should_remove(node):
+                    continue
+                self._flush_text(pending_text, parent)
+                if self._start_element(node):
+                    return
+                if node is root:
+                    # 解放で子要素のリストが変わるため、コピーをたどる
+                    children = list(node.contents) if release else node.contents
+                    stack.append((node, chain(children, following)))
+                else:
+                    stack.append((node, iter(node.contents)))
+            elif isinstance(node, PreformattedString):
+                # コメント等は出力しないが、前後のテキストはここで区切られる
+                self._flush_text(pending_text, parent)
+            elif isinstance(node, NavigableString):
+                pending_text.append(node)
+
+        self._flush_text(pending_text, None)
+
+    def _reached_footnote(self):
+        """変換中の見出しが「脚注」などの出力しない節であれば、見出し以降の出力を取り除いてTrueを返す"""
+        if self._heading_start is None or self.rules.stop_pattern is None:
+            return False
+        emitted = "".join(self.outtextlist[self._heading_start:])
+        match = self.rules.stop_pattern.search(emitted)
+        if match is None:
+            return False
+        self.outtextlist[self._heading_start:] = [emitted[:match.start()]]
+        return True
+
+    def _start_element(self, tag):
+        """要素の開始を変換する（出力しない節の見出しに到達した場合はTrueを返す）"""
+        if tag.name == 'span' and 'mw-editsection' in tag.get('class', ()):
+            # 旧来の形では[編集]リンクが<h2>の中にあるため、見出しの文字列はここまで
+            if self._reached_footnote():
+                return True
+        if tag.name == 'dt':
+            # 登場人物などの<dt>は見出しにする
+            self.handle_starttag('h4', [])
+            return False
+        if tag.name == 'h2':
+            self._heading_start = len(self.outtextlist)
+        attrs = [(name, _attribute_value(value)) for name, value in tag.attrs.items()]
+        self.handle_starttag(tag.name, attrs)
+        return False
+
+    def _end_element(self, tag):
+        """要素の終了を変換する（出力しない節の見出しに到達した場合はTrueを返す）"""
+        if tag.name == 'dt':
+            self.handle_endtag('h4')
+            return False
+        self.handle_endtag(tag.name)
+        if tag.name == 'h2':
+            if self._reached_footnote():
+                return True
+            self._heading_start = None
+        if tag.name == 'span' and 'mw-editsection' in tag.get('class', ()):
+            self._edit_link_pending = True
+        return False
+
+    def _flush_text(self, pending_text, parent):
+        """連続するテキストをまとめて、HTMLを解析した場合と同じ単位で渡す"""
+        if not pending_text:
+            return
+        text = "".join(pending_text)
+        pending_text.clear()
+
+        if parent is not None and parent.name in RAW_TEXT_TAGS:
+            self.handle_data(text)
+        else:
+            for piece in ENTITY_SPLIT_PATTERN.split(text):
+                if piece in ENTITY_NAMES:
+                    self.handle_entityref(ENTITY_NAMES[piece])
+                elif piece:
+                    self.handle_data(piece)
@@ -0,0 +1,131 @@
+import html as html_lib
+import os
+import re
+from urllib.parse import parse_qs, unquote, urlparse
+
+from http_client import fetch_json
+
+# ページ取得の方式（"html": 通常のページを取得 / "api": MediaWiki APIで本文だけを取得）
+FETCH_BACKENDS = ("html", "api")
+DEFAULT_FETCH_BACKEND = os.environ.get("WIKI2MD_FETCH_BACKEND", "html")
+
+# 1回のAPI呼び出しで問い合わせるタイトル数の上限（MediaWikiの制限は50件）
+MAX_TITLES_PER_QUERY = 50
+
+API_PATH = "/w/api.php"
+
+
+class MediaWikiAPIError(Exception):
+    """MediaWiki APIがエラーを返した場合の例外"""
+
+
+def parse_wiki_url(url):
+    """
+    WikipediaのURLから (APIのURL, ページタイトル, 版ID) を取り出す関数
+
+    /wiki/タイトル 形式と /w/index.php?title=タイトル 形式に対応します。
+    ?oldid= が指定されていれば版IDとして返します（なければNone）。
+    """
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    endpoint = f"{parsed.scheme}://{parsed.netloc}{API_PATH}"
+
+    if parsed.path.startswith('/wiki/'):
+        title = unquote(parsed.path[len('/wiki/'):])
+    else:
+        title = query.get('title', [''])[0]
+    oldid = query.get('oldid', [None])[0]
+    return endpoint, title.replace('_', ' '), oldid
+
+
+def _check_error(data):
+    if 'error' in data:
+        error = data['error']
+        raise MediaWikiAPIError(f"{error.get('code')}: {error.get('info')}")
+
+
+def query_revisions(endpoint, titles):
+    """
+    複数ページの最新の版IDをまとめて問い合わせる関数
+
+    MAX_TITLES_PER_QUERY 件ずつ1回のAPI呼び出しで問い合わせ、
+    表記の正規化とリダイレクトも解決します。
+
+    Args:
+        endpoint (str): APIのURL（https://ja.wikipedia.org/w/api.php など）。
+        titles (list): ページタイトルのリスト。
+
+    Returns:
+        dict: 入力タイトル → {"title": 解決後のタイトル, "revid": 版ID}。
+              存在しないページの revid は None になります。
+    """
+    results = {}
+    titles = list(dict.fromkeys(titles))
+    for start in range(0, len(titles), MAX_TITLES_PER_QUERY):
+        chunk = titles[start:start + MAX_TITLES_PER_QUERY]
+        data = fetch_json(endpoint, params={
+            'action': 'query',
+            'prop': 'revisions',
+            'rvprop': 'ids',
+            'titles': '|'.join(chunk),
+            'redirects': 1,
+            'format': 'json',
+            'formatversion': 2,
+        })
+        _check_error(data)
+        query = data.get('query', {})
+
+        # 入力タイトル → 正規化 → リダイレクト先 の順に解決する
+        aliases = {}
+        for entry in query.get('normalized', []) + query.get('redirects', []):
+            aliases[entry['from']] = entry['to']
+        pages = {}
+        for page in query.get('pages', []):
+            revisions = page.get('revisions') or []
+            pages[page['title']] = revisions[0]['revid'] if revisions and not page.get('missing') else None
+
+        for title in chunk:
+            resolved = title
+            seen = set()
+            while resolved in aliases and resolved not in seen:
+                seen.add(resolved)
+                resolved = aliases[resolved]
+            results[title] = {"title": resolved, "revid": pages.get(resolved)}
+    return results
+
+
+def fetch_article_html(endpoint, title=None, revid=None):
+    """
+    action=parse で記事本文のHTMLだけを取得する関数
+
+    スキン（ナビゲーション・サイドバー等）を含まない本文の
+    <div class="mw-parser-output"> の前に、タイトルの <h1 id="firstHeading"> を付けて返すため、
+    通常のページと同じ方法で解析できます。
+
+    Args:
+        endpoint (str): APIのURL。
+        title (str): ページタイトル（revid を指定しない場合）。
+        revid: 取得する版ID。指定するとその版の本文を取得します。
+
+    Returns:
+        tuple: (HTML文字列, 版ID)
+    """
+    params = {
+        'action': 'parse',
+        'prop': 'text|revid|displaytitle',
+        'redirects': 1,
+        'format': 'json',
+        'formatversion': 2,
+    }
+    if revid:
+        params['oldid'] = revid
+    else:
+        params['page'] = title
+    data = fetch_json(endpoint, params=params)
+    _check_error(data)
+
+    parse = data['parse']
+    # displaytitle はHTMLを含むことがあるため、タグを除いたテキストにする
+    display_title = html_lib.escape(html_lib.unescape(re.sub(r'<[^>]+>', '', parse.get('displaytitle') or parse['title'])))
+    html = f'<h1 id="firstHeading">{display_title}</h1>\n{parse["text"]}'
+    return html, parse.get('revid')
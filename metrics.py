@@ -0,0 +1,317 @@
+"""
+変換処理の段階ごとの計測（処理時間・バイト数）
+
+段階（fetch / cache / parse / transform / convert / postprocess / write）ごとに
+処理時間のヒストグラムとバイト数を集計し、Prometheus のテキスト形式で公開します。
+opentelemetry がインストールされていれば、各段階をスパンとしても記録します。
+WIKI2MD_TRACE_MEMORY=1 の場合は、ページごとのピークメモリ（tracemalloc）も集計します。
+"""
+import bisect
+import gc
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from opentelemetry import trace as _otel_trace
+except ImportError:  # opentelemetry は任意の依存関係
+    _otel_trace = None
+
+# 計測する段階（処理の順）
+STAGES = ("fetch", "cache", "parse", "transform", "convert", "postprocess", "write")
+
+# /metrics を公開するポート（未設定なら公開しない）
+METRICS_PORT = os.environ.get("WIKI2MD_METRICS_PORT")
+
+# 処理時間のヒストグラムの境界（0.5ミリ秒〜約2分を1.5倍刻み）
+DURATION_BUCKETS = tuple(0.0005 * 1.5 ** i for i in range(31))
+
+# 表示するパーセンタイル
+QUANTILES = (0.5, 0.95, 0.99)
+
+# ページごとのピークメモリを計測するかどうか（計測中はPythonのメモリ確保が遅くなる）
+TRACE_MEMORY = os.environ.get("WIKI2MD_TRACE_MEMORY", "0") == "1"
+
+# ピークメモリのヒストグラムの境界（64KB〜約8GBを1.5倍刻み）
+MEMORY_BUCKETS = tuple(64 * 1024 * 1.5 ** i for i in range(30))
+
+
+class Histogram:
+    """
+    固定の境界を持つヒストグラム
+
+    観測値そのものは保持しないため、観測回数に関わらずメモリ使用量は一定です。
+    パーセンタイルは該当する区間の中で線形補間して求めます。
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最後は上限なし（+Inf）
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """q（0〜1）のパーセンタイルを返す（観測がなければNone）"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """段階ごとの処理時間・バイト数と、ページ単位の成功・失敗件数を集計するクラス"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = {stage: Histogram() for stage in STAGES}
+        self._bytes = dict.fromkeys(STAGES, 0)
+        self._pages = {}
+        self._peak_memory = Histogram(MEMORY_BUCKETS)
+
+    def observe(self, stage, seconds, size=0):
+        """1回分の段階の処理時間（秒）と出力のバイト数を記録する"""
+        with self._lock:
+            if stage not in self._durations:
+                self._durations[stage] = Histogram()
+                self._bytes[stage] = 0
+            self._durations[stage].observe(seconds)
+            self._bytes[stage] += size
+
+    def count_page(self, status, cache_hit=False):
+        """処理したページを1件数える（status: "ok" / "error"）"""
+        key = (status, "hit" if cache_hit else "miss")
+        with self._lock:
+            self._pages[key] = self._pages.get(key, 0) + 1
+
+    def observe_peak_memory(self, size):
+        """1ページの変換中のピークメモリ（バイト）を記録する"""
+        with self._lock:
+            self._peak_memory.observe(size)
+
+    def peak_memory_summary(self):
+        """ページごとのピークメモリの {count, p50, p95, p99}（バイト、計測していなければNone）"""
+        with self._lock:
+            if self._peak_memory.count == 0:
+                return None
+            entry = {"count": self._peak_memory.count}
+            for q in QUANTILES:
+                entry[f"p{int(q * 100)}"] = self._peak_memory.quantile(q)
+            return entry
+
+    def summary(self):
+        """段階ごとの {count, sum, bytes, p50, p95, p99} を返す"""
+        with self._lock:
+            result = {}
+            for stage, histogram in self._durations.items():
+                if histogram.count == 0:
+                    continue
+                entry = {"count": histogram.count, "sum": histogram.sum, "bytes": self._bytes[stage]}
+                for q in QUANTILES:
+                    entry[f"p{int(q * 100)}"] = histogram.quantile(q)
+                result[stage] = entry
+            return result
+
+    def render_prometheus(self):
+        """Prometheus のテキスト形式で出力する"""
+        lines = [
+            "# HELP wiki2md_stage_duration_seconds Time spent in each conversion stage.",
+            "# TYPE wiki2md_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for stage, histogram in self._durations.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'wiki2md_stage_duration_seconds_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'wiki2md_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'wiki2md_stage_duration_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'wiki2md_stage_duration_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            lines.append("# HELP wiki2md_stage_duration_seconds_quantile Estimated percentiles of the stage durations.")
+            lines.append("# TYPE wiki2md_stage_duration_seconds_quantile gauge")
+            for stage, histogram in self._durations.items():
+                for q in QUANTILES:
+                    value = histogram.quantile(q)
+                    if value is not None:
+                        lines.append(f'wiki2md_stage_duration_seconds_quantile{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+
+            lines.append("# HELP wiki2md_stage_bytes_total Bytes produced by each conversion stage.")
+            lines.append("# TYPE wiki2md_stage_bytes_total counter")
+            for stage, size in self._bytes.items():
+                lines.append(f'wiki2md_stage_bytes_total{{stage="{stage}"}} {size}')
+
+            if self._peak_memory.count:
+                lines.append("# HELP wiki2md_page_peak_memory_bytes Peak traced memory while converting a page.")
+                lines.append("# TYPE wiki2md_page_peak_memory_bytes histogram")
+                cumulative = 0
+                for bound, count in zip(self._peak_memory.buckets, self._peak_memory.counts):
+                    cumulative += count
+                    lines.append(f'wiki2md_page_peak_memory_bytes_bucket{{le="{bound:.0f}"}} {cumulative}')
+                lines.append(f'wiki2md_page_peak_memory_bytes_bucket{{le="+Inf"}} {self._peak_memory.count}')
+                lines.append(f'wiki2md_page_peak_memory_bytes_sum {self._peak_memory.sum:.0f}')
+                lines.append(f'wiki2md_page_peak_memory_bytes_count {self._peak_memory.count}')
+
+            lines.append("# HELP wiki2md_pages_total Pages processed.")
+            lines.append("# TYPE wiki2md_pages_total counter")
+            for (status, cache), count in sorted(self._pages.items()):
+                lines.append(f'wiki2md_pages_total{{status="{status}",cache="{cache}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+# アプリ全体で共有する集計
+default_registry = MetricsRegistry()
+
+
+class StageMeasurement:
+    """record_stage の with ブロック内で、出力のバイト数を設定するためのオブジェクト"""
+
+    def __init__(self):
+        self.bytes = 0
+
+
+def trace_span(name, **attributes):
+    """opentelemetry があればスパンを開始する（なければ何もしない）"""
+    if _otel_trace is None:
+        return nullcontext()
+    return _otel_trace.get_tracer("wikipedia-to-markdown").start_as_current_span(name, attributes=attributes)
+
+
+@contextmanager
+def record_stage(stage, result=None, registry=None):
+    """
+    with ブロックの処理時間を1つの段階として記録する
+
+    result（ConversionResult）を渡すとその timings / byte_counts にも記録し、
+    例外が発生した場合は result.error_stage に段階名を設定します。
+
+        with record_stage("parse", result) as stage:
+            ...
+            stage.bytes = len(data)
+    """
+    measurement = StageMeasurement()
+    start = time.perf_counter()
+    with trace_span(f"wiki2md.{stage}"):
+        try:
+            yield measurement
+        except BaseException:
+            if result is not None:
+                result.error_stage = stage
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if result is not None:
+                result.timings[stage] = elapsed
+                result.byte_counts[stage] = measurement.bytes
+            (registry or default_registry).observe(stage, elapsed, measurement.bytes)
+
+
+def start_memory_tracing():
+    """WIKI2MD_TRACE_MEMORY=1 であれば tracemalloc を開始する関数"""
+    if TRACE_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+# tracemalloc のピークはプロセス全体で1つのため、計測は1ページずつ行う
+_peak_memory_lock = threading.Lock()
+
+
+@contextmanager
+def measure_peak_memory(result=None, registry=None):
+    """
+    with ブロックの間に増えたメモリのピーク（tracemalloc）を記録する
+
+    tracemalloc が開始されていなければ何もしません。ピークはプロセス全体の値で、
+    reset_peak() は他のスレッドの計測もやり直してしまうため、計測中のブロックは
+    ロックで1つずつ実行します（計測中は並列数を指定しても、このブロックの処理は1件ずつになります）。
+    result（ConversionResult）を渡すとその peak_memory にも記録します。
+    """
+    if not tracemalloc.is_tracing():
+        yield
+        return
+    with _peak_memory_lock:
+        # 前のページの解析ツリー（循環参照）が計測中に解放されて値がぶれないよう、先に回収しておく
+        gc.collect()
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            size = max(0, peak - start)
+            if result is not None:
+                result.peak_memory = size
+            (registry or default_registry).observe_peak_memory(size)
+
+
+def format_summary(summary):
+    """summary() の結果を表形式の文字列のリストにする（ミリ秒表示）"""
+    lines = [f"{'stage':<12}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'bytes':>14}"]
+    for stage in list(STAGES) + [s for s in summary if s not in STAGES]:
+        entry = summary.get(stage)
+        if entry is None:
+            continue
+        lines.append(
+            f"{stage:<12}{entry['count']:>8}{entry['p50'] * 1000:>10.1f}"
+            f"{entry['p95'] * 1000:>10.1f}{entry['p99'] * 1000:>10.1f}{entry['bytes']:>14,}"
+        )
+    return lines
+
+
+def format_memory_summary(summary):
+    """peak_memory_summary() の結果を表示用の文字列のリストにする（MB表示）"""
+    if summary is None:
+        return []
+    return [
+        f"peak memory / page  count {summary['count']}"
+        f"  p50 {summary['p50'] / 1e6:.1f} MB  p95 {summary['p95'] / 1e6:.1f} MB  p99 {summary['p99'] / 1e6:.1f} MB"
+    ]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = default_registry
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=None, host="0.0.0.0", registry=default_registry):
+    """
+    /metrics を公開するHTTPサーバーをバックグラウンドで起動する関数
+
+    port を省略すると WIKI2MD_METRICS_PORT を使用し、未設定ならサーバーを起動せずNoneを返します。
+    """
+    port = port if port is not None else METRICS_PORT
+    if port in (None, ""):
+        return None
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, int(port)), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
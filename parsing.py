@@ -0,0 +1,199 @@
+import importlib.util
+import os
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# 利用できるHTMLパーサー（上から順に既定値の候補）
+SUPPORTED_PARSERS = ("lxml", "html5-parser", "html.parser")
+
+# 本文を囲む <div class="mw-parser-output"> の開始タグ
+CONTENT_DIV_PATTERN = re.compile(r'<div\b[^>]*\bclass="[^"]*\bmw-parser-output\b[^"]*"[^>]*>')
+
+# 節ごとに区切って解析するときに、2つ目以降の節の前に付ける本文の開始タグ
+CONTENT_DIV_TAG = '<div class="mw-parser-output">'
+
+# ページタイトルの <h1 id="firstHeading"> の開始タグ
+TITLE_PATTERN = re.compile(r'<h1\b[^>]*\bid="firstHeading"[^>]*>')
+
+# 節の区切りを探すときに数える要素（<h2> と、<h2> を囲むことのある要素）の開始・終了タグ
+SECTION_TAG_PATTERN = re.compile(r'<(/?)(div|section|table|h2)\b([^>]*)>', re.I)
+
+
+def section_heading_pattern(section_ids):
+    """
+    指定したidの節（<h2 id="脚注"> など）の見出しの開始位置に一致する正規表現を返す関数
+
+    旧来の <h2><span class="mw-headline" id="脚注"> の形にも一致します。
+    """
+    ids = "|".join(re.escape(section_id) for section_id in section_ids)
+    return re.compile(rf'<h2\b(?:(?!</h2>).){{0,500}}?\bid="(?:{ids})"', re.S)
+
+
+def _has_content_class(value):
+    """class属性に mw-parser-output が含まれるか判定する（解析中は文字列で渡される）"""
+    if not value:
+        return False
+    classes = value.split() if isinstance(value, str) else value
+    return 'mw-parser-output' in classes
+
+
+CONTENT_STRAINER = SoupStrainer('div', attrs={'class': _has_content_class})
+TITLE_STRAINER = SoupStrainer('h1', attrs={'id': 'firstHeading'})
+
+
+def is_parser_available(name):
+    """指定したパーサーがこの環境で使えるか判定する関数"""
+    if name == "html.parser":
+        return True
+    module = {"lxml": "lxml", "html5-parser": "html5_parser"}.get(name)
+    return module is not None and importlib.util.find_spec(module) is not None
+
+
+def _default_parser():
+    requested = os.environ.get("WIKI2MD_PARSER")
+    if requested:
+        return requested
+    for name in SUPPORTED_PARSERS:
+        if is_parser_available(name):
+            return name
+    return "html.parser"
+
+
+DEFAULT_PARSER = _default_parser()
+
+
+def build_soup(markup, parser=None, parse_only=None):
+    """
+    指定したパーサーでBeautifulSoupのツリーを作成する関数
+
+    parse_only を指定すると、一致する要素とその子孫だけをツリーにします
+    （html5-parser は部分的な解析に対応していないため全体を解析します）。
+    """
+    parser = parser or DEFAULT_PARSER
+    if parser not in SUPPORTED_PARSERS:
+        raise ValueError(f"未対応のパーサーです: {parser}")
+    if parser == "html5-parser":
+        from html5_parser import parse
+        return parse(markup, treebuilder='soup')
+    return BeautifulSoup(markup, parser, parse_only=parse_only)
+
+
+def parse_wikipedia_html(html, parser=None, stop_pattern=None, body_fallback=False):
+    """
+    WikipediaのHTMLからページタイトルと本文の<div>だけを解析する関数
+
+    ページ全体（ナビゲーション・サイドバー・スクリプト等）のツリーは作らず、
+    本文の開始タグ以降だけを SoupStrainer で絞り込んで解析します。
+    開始タグが見つからない場合はページ全体を絞り込み付きで解析します。
+
+    Args:
+        html (str): ページのHTML。
+        parser (str): 使用するパーサー（"lxml" / "html5-parser" / "html.parser"）。
+        stop_pattern: 本文中でこれに一致した位置（脚注の見出しなど）より後ろを解析しない正規表現。
+        body_fallback (bool): 本文の<div>がない場合に <body> を本文として返すか
+            （Parsoid のHTMLは <div class="mw-parser-output"> を持たず、<body> が本文になる）。
+
+    Returns:
+        tuple: (ページタイトル, 本文のTag)。見つからなかったものはNone。
+    """
+    content_match = CONTENT_DIV_PATTERN.search(html)
+    if content_match is None:
+        soup = build_soup(html, parser)
+        title_tag = soup.find('h1', id='firstHeading')
+        content_div = soup.find('div', class_='mw-parser-output')
+        if content_div is None and body_fallback:
+            # ページ全体を解析済みのため、解析し直さずにそのツリーの <body> を使う
+            content_div = soup.body
+    else:
+        start = content_match.start()
+        title_tag = _parse_title(html, start, parser)
+        content_soup = build_soup(html[start:_content_end(html, content_match, stop_pattern)], parser,
+                                  parse_only=CONTENT_STRAINER)
+        content_div = content_soup.find('div', class_='mw-parser-output')
+
+    page_title = title_tag.get_text(strip=True) if title_tag else None
+    return page_title, content_div
+
+
+def parse_wikipedia_sections(html, parser=None, stop_pattern=None):
+    """
+    WikipediaのHTMLの本文を、h2 の節ごとに区切って1節ずつ解析する関数（省メモリモード用）
+
+    本文の直下の <h2>（または <h2> を囲む <div class="mw-heading mw-heading2">）の位置で区切り、
+    最初の節だけをここで解析します。2つ目以降の節は、返したイテレーターから要素を受け取るときに
+    1節ずつ解析し、次の節に進むときに前の節のツリーを解放するため、本文全体のツリーを一度に作りません。
+
+    Args:
+        html (str): ページのHTML。
+        parser (str): 使用するパーサー。
+        stop_pattern: 本文中でこれに一致した位置（脚注の見出しなど）より後ろを解析しない正規表現。
+
+    Returns:
+        tuple: (ページタイトル, 最初の節までの本文のTag, 2つ目以降の節の本文の直下の要素を順に返すイテレーター)。
+               本文の開始タグが見つからない場合は parse_wikipedia_html() と同じく全体を解析し、イテレーターは空です。
+    """
+    content_match = CONTENT_DIV_PATTERN.search(html)
+    if content_match is None:
+        page_title, content_div = parse_wikipedia_html(html, parser)
+        return page_title, content_div, iter(())
+
+    title_tag = _parse_title(html, content_match.start(), parser)
+    page_title = title_tag.get_text(strip=True) if title_tag else None
+    end = _content_end(html, content_match, stop_pattern)
+    boundaries = _section_boundaries(html, content_match.end(), end)
+
+    first_end = boundaries[0] if boundaries else end
+    content_soup = build_soup(html[content_match.start():first_end], parser, parse_only=CONTENT_STRAINER)
+    content_div = content_soup.find('div', class_='mw-parser-output')
+    return page_title, content_div, _iter_section_nodes(html, boundaries, end, parser)
+
+
+def _parse_title(html, content_start, parser):
+    """本文より前にあるタイトルの<h1>を、<h1>から本文の手前までだけを解析して返す（なければNone）"""
+    title_match = TITLE_PATTERN.search(html, 0, content_start)
+    if title_match is None:
+        return None
+    title_soup = build_soup(html[title_match.start():content_start], parser, parse_only=TITLE_STRAINER)
+    return title_soup.find('h1', id='firstHeading')
+
+
+def _content_end(html, content_match, stop_pattern):
+    """stop_pattern に一致した位置（なければNone）を返す"""
+    if stop_pattern is None:
+        return None
+    stop_match = stop_pattern.search(html, content_match.end())
+    return stop_match.start() if stop_match else None
+
+
+def _section_boundaries(html, start, end):
+    """本文の開始タグの後から、本文の直下にある節の見出しの開始位置のリストを返す"""
+    boundaries = []
+    depth = 0
+    for match in SECTION_TAG_PATTERN.finditer(html, start, len(html) if end is None else end):
+        closing, name = match.group(1), match.group(2).lower()
+        if closing:
+            if name != 'h2':
+                depth -= 1
+                if depth < 0:
+                    # 本文の<div>の終了タグ
+                    break
+            continue
+        if depth == 0 and (name == 'h2' or 'mw-heading2' in match.group(3)):
+            boundaries.append(match.start())
+        if name != 'h2' and not match.group(3).endswith('/'):
+            depth += 1
+    return boundaries
+
+
+def _iter_section_nodes(html, boundaries, end, parser):
+    """2つ目以降の節を1つずつ解析し、本文の直下の要素を順に返す（次の節に進むときに前の節を解放する）"""
+    for section_start, section_end in zip(boundaries, boundaries[1:] + [end]):
+        # 本文の開始タグを補って解析する（最後の節は本文の<div>の終了タグで終わる）
+        soup = build_soup(CONTENT_DIV_TAG + html[section_start:section_end], parser, parse_only=CONTENT_STRAINER)
+        try:
+            section_div = soup.find('div', class_='mw-parser-output')
+            if section_div is not None:
+                yield from list(section_div.contents)
+        finally:
+            soup.decompose()
@@ -0,0 +1,222 @@
+"""
+言語版ごとの整形ルール
+
+変換時に行う整形（どの節以降を出力しないか・[編集]リンクの形・変換前に取り除く要素）と、
+リンクをたどるときに記事として扱わない名前空間を言語版ごとのルールセットとして定義します。
+ルールセットはURLのホスト（ja.wikipedia.org → ja）から自動で選ばれます。
+
+各ルールセットの規則は、種類ごとに1つの正規表現（またはタグ名の辞書）にまとめて一度だけコンパイルするため、
+規則や言語を追加しても文書をたどる回数は増えません。
+
+    rules = rules_for_url("https://de.wikipedia.org/wiki/Python")
+    rules.name                  # "de"
+    register_rules(RuleSet("it", stop_sections=("Note", "Bibliografia"), edit_link_labels=("modifica",)))
+"""
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, FrozenSet, Optional, Tuple
+from urllib.parse import urlparse
+
+from parsing import section_heading_pattern
+
+# ホストから言語版が分からない場合のルールセット（"auto" 以外を指定するとURLに関わらずそのルールセットを使う）
+RULES = os.environ.get("WIKI2MD_RULES", "auto")
+DEFAULT_RULES = os.environ.get("WIKI2MD_DEFAULT_RULES", "ja")
+
+# Wikipediaのホスト（ja.wikipedia.org / ja.m.wikipedia.org）
+WIKIPEDIA_HOST_PATTERN = re.compile(r'^([a-z][a-z0-9-]*)\.(?:m\.)?wikipedia\.org$')
+
+# どの言語版でも使える英語の名前空間名（記事ではないページ）
+CANONICAL_NAMESPACES = (
+    "Media", "Special", "Talk", "User", "User talk", "Project", "Project talk", "Wikipedia", "Wikipedia talk",
+    "File", "File talk", "Image", "Image talk", "MediaWiki", "MediaWiki talk", "Template", "Template talk",
+    "Help", "Help talk", "Category", "Category talk", "Portal", "Portal talk", "Draft", "Draft talk",
+    "Module", "Module talk", "TimedText", "TimedText talk",
+)
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    """
+    1つの言語版の整形ルール
+
+    Attributes:
+        name: ルールセットの名前（言語コード）。
+        stop_sections: この名前のH2見出し（「脚注」「References」など）以降は出力しません。
+            見出し全体が一致する場合だけで、「References in popular culture」などは対象になりません。
+        edit_link_labels: 見出しの[編集]リンクの文字列。複数のリンクからなる場合は " | " で区切ります
+            （ドイツ語版の "Bearbeiten | Quelltext bearbeiten" など）。
+        removals: 変換前に取り除く要素（"div.navbox" のように タグ名.クラス名、またはタグ名だけ）。
+        namespaces: その言語版での記事ではない名前空間の名前（"Datei" / "Kategorie" など、ノートも含む）。
+            CANONICAL_NAMESPACES の英語名はどの言語版でも対象になります。変換結果には影響しません。
+    """
+    name: str
+    stop_sections: Tuple[str, ...] = ()
+    edit_link_labels: Tuple[str, ...] = ()
+    removals: Tuple[str, ...] = ()
+    namespaces: Tuple[str, ...] = ()
+
+    @cached_property
+    def stop_pattern(self) -> Optional[re.Pattern]:
+        """出力したH2見出しの行全体が出力しない節（「## 脚注」など）かどうかを判定する正規表現"""
+        if not self.stop_sections:
+            return None
+        names = '|'.join(re.escape(name) for name in self.stop_sections)
+        return re.compile(r'^## (?:' + names + r')[ \t]*$', re.M)
+
+    @cached_property
+    def stop_heading_pattern(self) -> Optional[re.Pattern]:
+        """HTML中の出力しない節の見出しの位置に一致する正規表現（省メモリモードで解析を打ち切るのに使う）"""
+        if not self.stop_sections:
+            return None
+        return section_heading_pattern([name.replace(' ', '_') for name in self.stop_sections])
+
+    @cached_property
+    def edit_link_pattern(self) -> Optional[re.Pattern]:
+        """[編集]リンクがMarkdownに変換された形（直後の改行まで含めて取り除く）"""
+        if not self.edit_link_labels:
+            return None
+        alternatives = []
+        for label in self.edit_link_labels:
+            links = r' \| '.join(rf'\[{re.escape(text)}\]\(.+?\)' for text in label.split(' | '))
+            alternatives.append(links)
+        return re.compile(r'\[(?:' + '|'.join(alternatives) + r')\]\n')
+
+    @cached_property
+    def removal_classes(self) -> Dict[str, Optional[FrozenSet[str]]]:
+        """タグ名 → 取り除くクラス名の集合（Noneならそのタグは全て取り除く）"""
+        removals = {}
+        for rule in self.removals:
+            tag_name, _, class_name = rule.partition('.')
+            if not class_name or removals.get(tag_name, ()) is None:
+                removals[tag_name] = None
+            else:
+                removals[tag_name] = removals.get(tag_name, frozenset()) | {class_name}
+        return removals
+
+    @cached_property
+    def non_article_namespaces(self) -> FrozenSet[str]:
+        """記事ではない名前空間の名前（小文字・空白区切り）"""
+        return frozenset(name.lower() for name in CANONICAL_NAMESPACES + self.namespaces)
+
+    def is_article_title(self, title) -> bool:
+        """タイトル（"Datei:Foo.jpg" など）が記事の名前空間かどうか"""
+        namespace, colon, _ = title.partition(':')
+        return not colon or namespace.replace('_', ' ').strip().lower() not in self.non_article_namespaces
+
+    def should_remove(self, tag) -> bool:
+        """要素が取り除く対象かどうか"""
+        if tag.name not in self.removal_classes:
+            return False
+        classes = self.removal_classes[tag.name]
+        return classes is None or not classes.isdisjoint(tag.get('class', ()))
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """ルールの内容のハッシュ（Markdownのキャッシュキーに含める）"""
+        text = repr((self.name, self.stop_sections, self.edit_link_labels, self.removals))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+# 言語版ごとのルールセット
+RULE_SETS: Dict[str, RuleSet] = {}
+
+
+def register_rules(rule_set):
+    """ルールセットを登録する関数（同じ名前のルールセットは置き換えます）"""
+    RULE_SETS[rule_set.name] = rule_set
+    return rule_set
+
+
+# ナビゲーションボックスは本文ではないため取り除く
+_COMMON_REMOVALS = ("div.navbox", "div.navbox-styles")
+
+# 日本語版は従来の変換と同じ出力にする（「## 脚注」以降の除外と[編集]リンクの削除のみ）
+register_rules(RuleSet(
+    "ja",
+    stop_sections=("脚注",),
+    edit_link_labels=("編集",),
+    namespaces=("特別", "ノート", "利用者", "利用者‐会話", "プロジェクト", "プロジェクト‐ノート", "ファイル", "ファイル‐ノート",
+                "画像", "MediaWiki‐ノート", "テンプレート", "Template‐ノート", "ヘルプ", "ヘルプ‐ノート", "カテゴリ",
+                "Category‐ノート", "ポータル", "ポータル‐ノート", "モジュール", "モジュール‐ノート", "Wikipedia‐ノート"),
+))
+register_rules(RuleSet(
+    "en",
+    stop_sections=("Notes", "References", "Footnotes", "Citations", "Sources", "Further reading",
+                   "External links"),
+    edit_link_labels=("edit | edit source", "edit"),
+    removals=_COMMON_REMOVALS,
+))
+register_rules(RuleSet(
+    "de",
+    stop_sections=("Einzelnachweise", "Anmerkungen", "Quellen", "Literatur", "Weblinks"),
+    edit_link_labels=("Bearbeiten | Quelltext bearbeiten", "Quelltext bearbeiten", "Bearbeiten"),
+    removals=_COMMON_REMOVALS,
+    namespaces=("Spezial", "Diskussion", "Benutzer", "Benutzerin", "Benutzer Diskussion", "Benutzerin Diskussion",
+                "Wikipedia Diskussion", "Datei", "Datei Diskussion", "Bild", "MediaWiki Diskussion", "Vorlage",
+                "Vorlage Diskussion", "Hilfe", "Hilfe Diskussion", "Kategorie", "Kategorie Diskussion",
+                "Portal Diskussion", "Modul", "Modul Diskussion"),
+))
+register_rules(RuleSet(
+    "fr",
+    stop_sections=("Notes et références", "Références", "Notes", "Bibliographie", "Liens externes"),
+    edit_link_labels=("modifier | modifier le code", "modifier le code", "modifier"),
+    removals=_COMMON_REMOVALS,
+    namespaces=("Spécial", "Discussion", "Utilisateur", "Utilisatrice", "Discussion utilisateur",
+                "Discussion utilisatrice", "Wikipédia", "Discussion Wikipédia", "Fichier", "Discussion fichier",
+                "Discussion MediaWiki", "Modèle", "Discussion modèle", "Aide", "Discussion aide", "Catégorie",
+                "Discussion catégorie", "Portail", "Discussion Portail", "Projet", "Discussion Projet",
+                "Module", "Discussion module", "Référence", "Discussion Référence"),
+))
+register_rules(RuleSet(
+    "es",
+    stop_sections=("Referencias", "Notas", "Bibliografía", "Enlaces externos"),
+    edit_link_labels=("editar | editar código", "editar código", "editar"),
+    removals=_COMMON_REMOVALS,
+    namespaces=("Especial", "Discusión", "Usuario", "Usuaria", "Usuario discusión", "Usuaria discusión",
+                "Wikipedia discusión", "Archivo", "Archivo discusión", "Imagen", "MediaWiki discusión", "Plantilla",
+                "Plantilla discusión", "Ayuda", "Ayuda discusión", "Categoría", "Categoría discusión",
+                "Portal discusión", "Wikiproyecto", "Wikiproyecto discusión", "Anexo discusión", "Módulo",
+                "Módulo discusión"),
+))
+register_rules(RuleSet(
+    "zh",
+    stop_sections=("参考文献", "參考文獻", "注释", "註釋", "参考资料", "參考資料", "外部链接", "外部連結"),
+    edit_link_labels=("编辑", "編輯", "编辑源代码", "編輯原始碼"),
+    removals=_COMMON_REMOVALS,
+    namespaces=("特殊", "讨论", "討論", "用户", "用戶", "用户讨论", "用戶討論", "维基百科", "維基百科", "维基百科讨论",
+                "維基百科討論", "文件", "檔案", "图像", "圖像", "文件讨论", "檔案討論", "模板", "模板讨论", "模板討論",
+                "帮助", "幫助", "帮助讨论", "幫助討論", "分类", "分類", "分类讨论", "分類討論", "主题", "主題",
+                "主题讨论", "主題討論", "模块", "模組", "模块讨论", "模組討論", "草稿", "草稿讨论", "草稿討論"),
+))
+
+
+def get_rules(name=None):
+    """名前でルールセットを返す関数（見つからなければ DEFAULT_RULES）"""
+    return RULE_SETS.get(name) or RULE_SETS[DEFAULT_RULES]
+
+
+def detect_language(url):
+    """URLのホストから言語版（ja / en / de ...）を返す関数（Wikipedia以外はNone）"""
+    match = WIKIPEDIA_HOST_PATTERN.match(urlparse(url or '').netloc.lower())
+    return match.group(1) if match else None
+
+
+def rules_for_language(language):
+    """
+    言語版（ja / en / de ...）に合うルールセットを返す関数
+
+    WIKI2MD_RULES が "auto"（既定値）であればその言語版のルールセット、
+    それ以外であれば指定したルールセットを返します。
+    """
+    if RULES != "auto":
+        return get_rules(RULES)
+    return get_rules(language)
+
+
+def rules_for_url(url):
+    """URLのホストの言語版に合うルールセットを返す関数（WIKI2MD_RULES の扱いは rules_for_language() と同じ）"""
+    return rules_for_language(detect_language(url))
@@ -0,0 +1,278 @@
+"""
+変換済みページの差分同期
+
+変換済みのページ（1ページ1ファイルのディレクトリ）を最新の状態に更新します。
+各ページの版IDとMarkdownのハッシュを出力先のマニフェストに保存しておき、
+同期のたびに最新の版IDをAPIでまとめて問い合わせて、版が変わったページだけを取得・変換します。
+そのため毎晩の更新にかかる時間は、ページ数ではなく編集されたページ数に比例します。
+
+使い方:
+    python sync.py urls.txt -o mirror/
+    python sync.py urls.txt -o mirror/ --prune      # URLリストから消えたページのファイルも削除する
+
+同期のたびに変更内容（追加・更新・変更なし・削除・URLリスト外・失敗）を
+mirror/.wiki2md_changes/ に1つのJSONとして書き出します。
+
+ファイル名はページタイトルから作り、別の言語版の同名のページなど、他のページと同じ名前になる場合は
+連番（Python_2.md）を付けます。一度決めたファイル名は、次回以降の同期でも変わりません。
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+from batch import DEFAULT_MAX_WORKERS, iter_batch
+from cli import read_urls
+from core import canonicalize_url, convert_url, get_filename_from_url, prefetch_revisions
+from mediawiki_api import DEFAULT_FETCH_BACKEND, FETCH_BACKENDS
+from metrics import default_registry, format_summary, record_stage
+
+# 出力先ディレクトリに保存するマニフェストと変更履歴
+MANIFEST_FILENAME = ".wiki2md_manifest.json"
+CHANGES_DIRNAME = ".wiki2md_changes"
+
+# ページごとの同期結果
+ADDED = "added"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+REMOVED = "removed"
+ORPHANED = "orphaned"  # URLリストから消えたが、--prune なしのためファイルを残したページ
+FAILED = "failed"
+
+
+def content_hash(markdown_content):
+    """MarkdownのSHA-256（16進数）"""
+    return hashlib.sha256(markdown_content.encode("utf-8")).hexdigest()
+
+
+def write_json_atomic(path, data):
+    """途中で止まっても壊れたファイルが残らないように、一時ファイルに書いてから置き換える"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class Manifest:
+    """
+    出力先のページの一覧（そろえたURL → ファイル名・タイトル・版ID・ハッシュ）
+
+    ファイル例:
+        {"pages": {"https://ja.wikipedia.org/wiki/Python": {
+            "url": "https://ja.wikipedia.org/wiki/Python", "filename": "Python.md",
+            "title": "Python", "revid": 123456, "sha256": "...", "synced_at": 1700000000.0}}}
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.pages = json.load(f).get("pages", {})
+
+    def save(self):
+        write_json_atomic(self.path, {"pages": self.pages})
+
+
+def plan_sync(urls, manifest, revisions, directory):
+    """
+    取得が必要なURLを決める関数
+
+    マニフェストの版IDと最新の版IDが同じで、出力ファイルも残っているページは取得しません。
+    最新の版IDが分からないページ（問い合わせの失敗など）は取得し直します。
+
+    Returns:
+        tuple: (取得するURLのリスト, 変更のないURLのリスト)
+    """
+    to_fetch = []
+    unchanged = []
+    for url in urls:
+        entry = manifest.pages.get(canonicalize_url(url))
+        revid = revisions.get(url)
+        if (
+            entry is not None
+            and revid is not None
+            and entry.get("revid") == revid
+            and os.path.exists(os.path.join(directory, entry["filename"]))
+        ):
+            unchanged.append(url)
+        else:
+            to_fetch.append(url)
+    return to_fetch, unchanged
+
+
+def assign_filename(filename, previous, used_filenames):
+    """
+    同期先で使うファイル名を決める関数
+
+    前回同期したページで、ファイル名が前回と同じ（または同じ名前に連番を付けたもの）であれば前回のまま使い、
+    それ以外は他のページと重ならないように連番を付けます（export.StreamingExporter と同じ規則）。
+
+    Args:
+        filename (str): URLから作ったファイル名。
+        previous (dict): マニフェストの前回のエントリ（初めて同期するページはNone）。
+        used_filenames (set): 他のページが使っているファイル名（決めた名前を追加します）。
+    """
+    name, extension = os.path.splitext(filename)
+    if previous is not None and re.fullmatch(
+        re.escape(name) + r'(?:_\d+)?' + re.escape(extension), previous["filename"]
+    ):
+        return previous["filename"]
+    candidate = filename
+    index = 2
+    while candidate in used_filenames:
+        candidate = f"{name}_{index}{extension}"
+        index += 1
+    used_filenames.add(candidate)
+    return candidate
+
+
+def sync(urls, directory, max_workers=DEFAULT_MAX_WORKERS, backend=None, prune=False, log=None):
+    """
+    URLリストのページを directory に差分同期する関数
+
+    Args:
+        urls (list): WikipediaのURLのリスト。
+        directory (str): 出力先ディレクトリ（マニフェストもここに保存します）。
+        max_workers (int): 並列数。
+        backend (str): 取得方式（"html" / "api"）。
+        prune (bool): URLリストから消えたページのファイルを削除するかどうか
+            （削除しない場合は変更内容の "orphaned" に入ります）。
+        log: 進捗を表示する関数（省略時は表示しません）。
+
+    Returns:
+        dict: 変更内容（変更マニフェストと同じ内容）。
+    """
+    log = log or (lambda *lines: None)
+    backend = backend or DEFAULT_FETCH_BACKEND
+    os.makedirs(directory, exist_ok=True)
+    manifest = Manifest(os.path.join(directory, MANIFEST_FILENAME))
+    started_at = time.time()
+
+    # 同じページを指すURLは最初の1件だけを同期する
+    unique_urls = {}
+    for url in urls:
+        unique_urls.setdefault(canonicalize_url(url), url)
+    urls = list(unique_urls.values())
+
+    # 最新の版IDをまとめて問い合わせ、版が変わったページだけを取得する
+    revisions = prefetch_revisions(urls)
+    to_fetch, unchanged = plan_sync(urls, manifest, revisions, directory)
+    log(f"対象 {len(urls)} ページ: 取得 {len(to_fetch)} / 変更なし {len(unchanged)}")
+
+    changes = {ADDED: [], UPDATED: [], UNCHANGED: [], REMOVED: [], ORPHANED: [], FAILED: []}
+    # 同期先で使われているファイル名（別のページと同じ名前で上書きしないため）
+    used_filenames = {entry["filename"] for entry in manifest.pages.values()}
+    for url in unchanged:
+        changes[UNCHANGED].append({"url": url, "revid": revisions[url]})
+
+    def convert(url):
+        return convert_url(url, backend, revisions.get(url))
+
+    for url, result in iter_batch(convert, to_fetch, max_workers=max_workers):
+        key = canonicalize_url(url)
+        previous = manifest.pages.get(key)
+        if not result.ok:
+            # 失敗したページは前回のファイルとマニフェストをそのまま残す
+            changes[FAILED].append({"url": url, "error": result.error})
+            log(f"❌ {url}: {result.error}")
+            continue
+
+        filename = assign_filename(get_filename_from_url(url), previous, used_filenames)
+        digest = content_hash(result.markdown)
+        revid = revisions.get(url)
+        path = os.path.join(directory, filename)
+        if previous is not None and previous["sha256"] == digest and os.path.exists(path):
+            # 版は変わったが変換結果が同じ（カテゴリだけの編集など）ならファイルは書き換えない
+            status = UNCHANGED
+        else:
+            with record_stage("write") as stage:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(result.markdown)
+                stage.bytes = len(result.markdown.encode("utf-8"))
+            status = ADDED if previous is None else UPDATED
+            if previous is not None and previous["filename"] != filename:
+                _remove_file(directory, previous["filename"])
+                used_filenames.discard(previous["filename"])
+
+        manifest.pages[key] = {
+            "url": url,
+            "filename": filename,
+            "title": result.title,
+            "revid": revid,
+            "sha256": digest,
+            "synced_at": time.time(),
+        }
+        change = {"url": url, "filename": filename, "revid": revid, "sha256": digest}
+        if previous is not None:
+            change["previous_revid"] = previous.get("revid")
+            change["previous_sha256"] = previous["sha256"]
+        changes[status].append(change)
+        if status != UNCHANGED:
+            log(f"{'➕' if status == ADDED else '🔄'} {url}")
+
+    # URLリストから消えたページ
+    for key in list(manifest.pages):
+        if key in unique_urls:
+            continue
+        entry = manifest.pages[key]
+        change = {"url": entry["url"], "filename": entry["filename"], "revid": entry.get("revid")}
+        if prune:
+            _remove_file(directory, entry["filename"])
+            del manifest.pages[key]
+            changes[REMOVED].append(change)
+        else:
+            changes[ORPHANED].append(change)
+
+    manifest.save()
+    report = {
+        "started_at": started_at,
+        "finished_at": time.time(),
+        "backend": backend,
+        "pruned": prune,
+        "counts": {status: len(entries) for status, entries in changes.items()},
+        "changes": changes,
+    }
+    changes_dir = os.path.join(directory, CHANGES_DIRNAME)
+    os.makedirs(changes_dir, exist_ok=True)
+    timestamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(started_at)) + f".{int(started_at % 1 * 1000):03d}"
+    report["path"] = os.path.join(changes_dir, timestamp + ".json")
+    write_json_atomic(report["path"], report)
+    return report
+
+
+def _remove_file(directory, filename):
+    try:
+        os.remove(os.path.join(directory, filename))
+    except FileNotFoundError:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="変換済みのページを版IDで差分同期します")
+    parser.add_argument("input", nargs="?", default="-", help="URLリストのファイル（1行に1つ、省略時は標準入力）")
+    parser.add_argument("-o", "--output-dir", required=True, help="同期先のディレクトリ")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_MAX_WORKERS, help="並列数")
+    parser.add_argument("--backend", choices=FETCH_BACKENDS, default=DEFAULT_FETCH_BACKEND, help="取得方式")
+    parser.add_argument("--prune", action="store_true", help="URLリストから消えたページのファイルを削除する")
+    parser.add_argument("-q", "--quiet", action="store_true", help="ページごとの結果を表示しない")
+    args = parser.parse_args(argv)
+
+    log = (lambda *lines: None) if args.quiet else (lambda *lines: print(*lines, sep="\n", file=sys.stderr))
+    report = sync(read_urls(args.input), args.output_dir, args.workers, args.backend, args.prune, log)
+    counts = report["counts"]
+    print(
+        f"同期完了: 追加 {counts[ADDED]} / 更新 {counts[UPDATED]} / 変更なし {counts[UNCHANGED]}"
+        f" / 削除 {counts[REMOVED]} / URLリスト外 {counts[ORPHANED]} / 失敗 {counts[FAILED]}",
+        file=sys.stderr,
+    )
+    print(f"変更内容: {report['path']}", file=sys.stderr)
+    log(*format_summary(default_registry.summary()))
+    return 1 if counts[FAILED] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+mediawiki_api のテスト（benchmarks.server のローカルのスタブサーバーを使用）
+
+    python -m unittest discover tests
+"""
+import unittest
+
+from benchmarks.corpus import CorpusPage
+from benchmarks.sample_pages import generate_page
+from benchmarks.server import start_server
+from mediawiki_api import (
+    MAX_TITLES_PER_QUERY,
+    MediaWikiAPIError,
+    fetch_article_html,
+    parse_wiki_url,
+    query_revisions,
+)
+from parsing import parse_wikipedia_html
+
+
+def _page(title, revid):
+    return CorpusPage(title, title, generate_page(title=title, sections=2, seed=revid, revision=revid), revid)
+
+
+class MediaWikiAPITest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pages = [_page("Python", 111), _page("JavaScript", 222)]
+        pages += [_page(f"Page {index}", 1000 + index) for index in range(MAX_TITLES_PER_QUERY + 10)]
+        cls.server = start_server(pages, redirects={"Py": "Python"})
+        cls.endpoint = f"http://127.0.0.1:{cls.server.server_address[1]}/w/api.php"
+        cls.api_requests = cls.server.RequestHandlerClass.api_requests
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.api_requests.clear()
+
+    def test_query_revisions(self):
+        results = query_revisions(self.endpoint, ["Python", "JavaScript"])
+        self.assertEqual(results, {
+            "Python": {"title": "Python", "revid": 111},
+            "JavaScript": {"title": "JavaScript", "revid": 222},
+        })
+        self.assertEqual(len(self.api_requests), 1)
+
+    def test_query_revisions_normalizes_titles(self):
+        results = query_revisions(self.endpoint, ["python", "Page_3"])
+        self.assertEqual(results["python"], {"title": "Python", "revid": 111})
+        self.assertEqual(results["Page_3"], {"title": "Page 3", "revid": 1003})
+
+    def test_query_revisions_follows_redirects(self):
+        # 正規化（py → Py）の後にリダイレクト（Py → Python）を解決する
+        results = query_revisions(self.endpoint, ["Py", "py"])
+        self.assertEqual(results["Py"], {"title": "Python", "revid": 111})
+        self.assertEqual(results["py"], {"title": "Python", "revid": 111})
+
+    def test_query_revisions_missing_page(self):
+        results = query_revisions(self.endpoint, ["Python", "No such page"])
+        self.assertEqual(results["No such page"], {"title": "No such page", "revid": None})
+        self.assertEqual(results["Python"]["revid"], 111)
+
+    def test_query_revisions_chunks_titles(self):
+        titles = [f"Page {index}" for index in range(MAX_TITLES_PER_QUERY + 10)]
+        results = query_revisions(self.endpoint, titles + titles[:5])
+        self.assertEqual(len(results), len(titles))
+        self.assertEqual([results[title]["revid"] for title in titles], [1000 + index for index in range(len(titles))])
+        # 重複を除いた60件を50件・10件の2回に分けて問い合わせる
+        self.assertEqual(len(self.api_requests), 2)
+        self.assertEqual([len(request["titles"].split("|")) for request in self.api_requests],
+                         [MAX_TITLES_PER_QUERY, 10])
+
+    def test_fetch_article_html_by_title(self):
+        html, revid = fetch_article_html(self.endpoint, title="Python")
+        self.assertEqual(revid, 111)
+        title, content_div = parse_wikipedia_html(html)
+        self.assertEqual(title, "Python")
+        self.assertIsNotNone(content_div)
+        self.assertEqual(self.api_requests[0]["page"], "Python")
+
+    def test_fetch_article_html_by_revid(self):
+        html, revid = fetch_article_html(self.endpoint, revid=222)
+        self.assertEqual(revid, 222)
+        self.assertEqual(parse_wikipedia_html(html)[0], "JavaScript")
+        self.assertEqual(self.api_requests[0]["oldid"], "222")
+        self.assertNotIn("page", self.api_requests[0])
+
+    def test_fetch_article_html_missing_page(self):
+        with self.assertRaises(MediaWikiAPIError) as context:
+            fetch_article_html(self.endpoint, title="No such page")
+        self.assertIn("missingtitle", str(context.exception))
+
+    def test_parse_wiki_url(self):
+        self.assertEqual(
+            parse_wiki_url("https://ja.wikipedia.org/wiki/Python_(%E8%A8%80%E8%AA%9E)"),
+            ("https://ja.wikipedia.org/w/api.php", "Python (言語)", None),
+        )
+        self.assertEqual(
+            parse_wiki_url("https://ja.wikipedia.org/w/index.php?title=Python&oldid=123"),
+            ("https://ja.wikipedia.org/w/api.php", "Python", "123"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()